@@ -10,7 +10,6 @@ import path from 'path';
 import fs from 'fs';
 import fetch from 'node-fetch';
 import { analyzeXrayWithGemini, extractKeyFindings } from "../services/gemini-service.js";
-import { spawn } from "child_process";
 import { fileURLToPath } from 'url';
 import { dirname } from 'path';
 
@@ -30,6 +29,7 @@ import {
     makeCombinedBinaryPrediction,
 } from '../services/loadBinaryModels.js';
 import { validateXrayWithThreshold } from "../services/xrayValidation.js";
+import { startSymptomWorker, predictSymptoms, predictSymptomsBatch, stopSymptomWorker } from "../services/symptomWorker.js";
 
 
 // Simple logging utility
@@ -459,42 +459,23 @@ const detectionController = asyncHandler(async (req, res, next) => {
 
          const symtomDetection =asyncHandler(async  (req,res)=>{ const input = req.body;
 
- const scriptPath = path.join(__dirname, "..", "services", "predict.py");
-
-  const py = spawn("python", [scriptPath, JSON.stringify(input)]);
-
-  let result = "";
-
-  py.stdout.on("data", (data) => {
-    result += data.toString();
-  });
+  let prediction;
+  try {
+    prediction = await predictSymptoms(input);
+  } catch (err) {
+    console.error("Symptom Prediction Error:", err);
+    return res.status(500).json({
+      prediction: "Error",
+      confidence: {
+        Pneumonia: null,
+        Tuberculosis: null
+      }
+    });
+  }
 
-  py.stderr.on("data", (err) => {
-    console.error("Python Error:", err.toString());
-  });
+  const { pred, pneuProb, tbProb } = prediction;
+  await responsefunction(pred, pneuProb, tbProb)
 
-  py.on("close", () => {
-    
-    try {
-      const lines = result.trim().split("\n");
-      const lastLine = lines[lines.length - 1];
-      const [pred, pneuProb, tbProb] = lastLine.split(" ");
-      responsefunction(pred,pneuProb,tbProb)
-
-       
-
-     
-    } catch (err) {
-      console.error("Parse Error:", err);
-      res.status(500).json({
-        prediction: "Error",
-        confidence: {
-          Pneumonia: null,
-          Tuberculosis: null
-        }
-      });
-    }
-  })
   async function  responsefunction(pred, pneuProb,tbProb ){
   let id= req.params.id;
    id= new Types.ObjectId(id);
@@ -530,6 +511,53 @@ console.log("========================",i)
       });}
 })
 
+// Batch symptom prediction: body is { records: [{ id: <detection entry id>, symptoms: {...} }] }
+// Runs one vectorized prediction for all records and stores each result on its detection entry
+const symptomDetectionBatch = asyncHandler(async (req, res) => {
+    const records = req.body?.records;
+    if (!Array.isArray(records) || records.length === 0) {
+        throw new apiError(400, "records must be a non-empty array");
+    }
+
+    const predictions = await predictSymptomsBatch(records.map((record) => record.symptoms || {}));
+
+    const results = [];
+    for (let index = 0; index < records.length; index++) {
+        const { pred, pneuProb, tbProb } = predictions[index];
+        const entry = {
+            id: records[index].id,
+            prediction: pred === "0" ? "Pneumonia" : "Tuberculosis",
+            confidence: {
+                Pneumonia: Math.round(parseFloat(pneuProb) * 100),
+                Tuberculosis: Math.round(parseFloat(tbProb) * 100)
+            }
+        };
+
+        try {
+            const id = new Types.ObjectId(records[index].id);
+            const detection = await Detection.findOne({ "detection._id": id });
+            const i = detection ? detection.detection.findIndex(n => n._id.equals(id)) : -1;
+            if (i === -1) throw new Error("Detection entry not found");
+
+            detection.detection[i].symptomPrediction.push({
+                Prediction: entry.prediction,
+                pneumoniaConfidenceSymptom: entry.confidence.Pneumonia,
+                tubercluosisConfidenceSymptom: entry.confidence.Tuberculosis
+            });
+            await detection.save();
+            entry.saved = true;
+        } catch (error) {
+            entry.saved = false;
+            entry.error = error.message;
+        }
+
+        results.push(entry);
+    }
+
+    logger.info('Batch symptom prediction completed', { total: records.length });
+    res.json(new apiResponse(200, results, "Batch symptom prediction completed"));
+});
+
  
          
 
@@ -625,6 +653,9 @@ const initializeModel = async () => {
         await loadMultilabelModel();
         logger.info("Multilabel model initialization completed successfully");
 
+        await startSymptomWorker();
+        logger.info("Symptom model worker initialization completed successfully");
+
         logger.info("All models initialization completed successfully");
     } catch (error) {
         logger.error("Model initialization failed", error);
@@ -636,6 +667,7 @@ const initializeModel = async () => {
 const gracefulShutdown = () => {
     logger.info("Graceful shutdown initiated...");
     disposeMultilabelModel();
+    stopSymptomWorker();
     tf.disposeVariables();
     logger.info("TensorFlow resources cleaned up");
 };
@@ -648,6 +680,7 @@ initializeModel();
 export {
     detectionController,
     symtomDetection,
+    symptomDetectionBatch,
     getDetectedResults,
 
     authchecker,
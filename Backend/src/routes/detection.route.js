@@ -1,5 +1,5 @@
 import { Router } from "express"
-import { detectionController, getDetectedResults, authchecker ,symtomDetection} from "../controllers/detection.controller.js"
+import { detectionController, getDetectedResults, authchecker ,symtomDetection, symptomDetectionBatch} from "../controllers/detection.controller.js"
 import auth from "../middlewares/auth.middleware.js"
 import upload from "../middlewares/multer.js"
 
@@ -10,6 +10,7 @@ detectionRouter.route("/sendImage/:MR_no").post(auth("admin"), upload.single("xr
 detectionRouter.route("/getDetectedResults/:MR_no").get(auth("admin"), getDetectedResults)
 
 detectionRouter.route("/sendSymptoms/:id").post( symtomDetection)
+detectionRouter.route("/sendSymptomsBatch").post(auth("admin"), symptomDetectionBatch)
 
 
 
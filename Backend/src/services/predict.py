@@ -1,37 +1,200 @@
 import sys
+import json
+import warnings
 import joblib
-import pandas as pd
+import numpy as np
 import os
 
+# The encoder feeds plain arrays, so sklearn's feature-name check has nothing to compare
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
 # ✅ Step 1: Get current directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 # ✅ Step 2: Path to trained model
 model_path = os.path.join(current_dir, "..", "trained_model", "symptomModel", "rf_model.pkl")
 
-# ✅ Step 3: Load model
+# ✅ Step 3: Load model (once per process, reused by every request in --serve mode)
 model = joblib.load(model_path)
 
-# ✅ Step 4: Get input from Node.js
-input_data = sys.argv[1]
-input_dict = eval(input_data)  # JSON string → dict
-input_df = pd.DataFrame([input_dict])
 
-# ✅ Step 5: One-hot encoding
-input_df = pd.get_dummies(input_df)
+class SymptomEncoder:
+    """
+    One-hot encoder compiled once from the model's feature_names_in_.
+
+    Produces the same matrix as pd.get_dummies + adding missing columns +
+    reordering to feature_names_in_, without building any DataFrame:
+    string values set their "<key>_<value>" slot to 1, numeric/bool values
+    are copied into the column named "<key>", and anything the model was not
+    trained on is dropped.
+    """
+
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self.column_index = {name: i for i, name in enumerate(self.feature_names)}
+
+        # category -> slot lookup for every possible "<key>_<value>" split of each column
+        self.category_slots = {}
+        for i, name in enumerate(self.feature_names):
+            for pos, char in enumerate(name):
+                if char == "_":
+                    self.category_slots.setdefault(name[:pos], {})[name[pos + 1:]] = i
+
+    def encode(self, records):
+        # ✅ Write every record straight into a preallocated matrix
+        if isinstance(records, dict):
+            records = [records]
+
+        matrix = np.zeros((len(records), len(self.feature_names)), dtype=np.float32)
+        for row, record in enumerate(records):
+            for key, value in record.items():
+                if isinstance(value, str):
+                    slot = self.category_slots.get(key, {}).get(value)
+                    if slot is not None:
+                        matrix[row, slot] = 1.0
+                elif isinstance(value, (bool, int, float)):
+                    slot = self.column_index.get(key)
+                    if slot is not None:
+                        matrix[row, slot] = value
+        return matrix
+
+
+encoder = SymptomEncoder(model.feature_names_in_)
+
+
+def predict_batch(records):
+    # ✅ Step 4: One-hot encode every record into the model's column order
+    features = encoder.encode(records)
+
+    # ✅ Step 5: One forest pass for all rows; the class is the argmax, exactly as model.predict does
+    probs = model.predict_proba(features)
+    preds = model.classes_.take(np.argmax(probs, axis=1))
+
+    return preds, probs
+
+
+def predict_symptoms(input_dict):
+    preds, probs = predict_batch([input_dict])
+    return preds[0], probs[0][0], probs[0][1]
+
+
+def format_result(pred, probs):
+    return {"prediction": str(pred), "probabilities": [float(p) for p in probs]}
+
+
+def load_batch_records(path):
+    # ✅ Accept a JSON array or JSONL file ("-" reads stdin)
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(stripped)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def run_batch(path):
+    # Records are either plain symptom dicts or {"id": ..., "input": {...}}
+    records = load_batch_records(path)
+    inputs = [record["input"] if "input" in record else record for record in records]
+
+    preds, probs = predict_batch(inputs) if inputs else ([], [])
+
+    results = []
+    for index, (record, pred, row_probs) in enumerate(zip(records, preds, probs)):
+        result = {"index": index, "id": record.get("id") if "input" in record else None}
+        result.update(format_result(pred, row_probs))
+        results.append(result)
+
+    print(json.dumps({"count": len(results), "classes": [str(c) for c in model.classes_], "results": results}))
+
+
+def legacy_encode(input_dict):
+    # Original pandas path, kept only to check the encoder against it
+    import pandas as pd
+
+    input_df = pd.get_dummies(pd.DataFrame([input_dict]))
+    missing_cols = [col for col in model.feature_names_in_ if col not in input_df.columns]
+    if missing_cols:
+        missing_df = pd.DataFrame([[0]*len(missing_cols)], columns=missing_cols)
+        input_df = pd.concat([input_df, missing_df], axis=1)
+    return input_df[model.feature_names_in_]
+
+
+def random_records(count, seed=0):
+    # ✅ Random symptom records over the model's own columns (plus one unseen value)
+    rng = np.random.default_rng(seed)
+    keys = sorted(key for key in encoder.category_slots if key.startswith("Symptom_"))
+    values = sorted({value for key in keys for value in encoder.category_slots[key]}) + ["unknown symptom"]
+
+    records = []
+    for _ in range(count):
+        record = {}
+        for key in keys:
+            if rng.random() < 0.6:
+                record[key] = values[rng.integers(len(values))]
+        if not record:
+            record[keys[0]] = values[0]
+        records.append(record)
+    return records
+
+
+def check_parity(samples=500, seed=0):
+    # ✅ Compare the encoder against the get_dummies path on random symptom records
+    mismatches = 0
+    for record in random_records(samples, seed):
+        expected = legacy_encode(record)
+        actual = encoder.encode(record)
+        same_features = np.array_equal(expected.to_numpy(dtype=np.float32), actual)
+        same_probs = np.allclose(model.predict_proba(expected), model.predict_proba(actual))
+        if not (same_features and same_probs):
+            mismatches += 1
+            print(f"Mismatch for {record}", file=sys.stderr)
+
+    print(json.dumps({"samples": samples, "mismatches": mismatches}))
+    return mismatches == 0
+
+
+def serve():
+    # ✅ Long-lived mode: one JSON request per stdin line, one JSON response per stdout line
+    print(json.dumps({"ready": True}), flush=True)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if "inputs" in request:
+                preds, probs = predict_batch(request["inputs"]) if request["inputs"] else ([], [])
+                response = {"id": request_id, "results": [format_result(p, row) for p, row in zip(preds, probs)]}
+            else:
+                preds, probs = predict_batch([request["input"]])
+                response = {"id": request_id}
+                response.update(format_result(preds[0], probs[0]))
+        except Exception as e:
+            response = {"id": request_id, "error": str(e)}
 
-# ✅ Step 6: Add missing columns (optimized to avoid fragmentation warning)
-missing_cols = [col for col in model.feature_names_in_ if col not in input_df.columns]
-if missing_cols:
-    missing_df = pd.DataFrame([[0]*len(missing_cols)], columns=missing_cols)
-    input_df = pd.concat([input_df, missing_df], axis=1)
+        print(json.dumps(response), flush=True)
 
-# ✅ Step 7: Ensure same column order as training
-input_df = input_df[model.feature_names_in_]
 
-# ✅ Step 8: Predict class & probabilities
-probs = model.predict_proba(input_df)[0]
-pred = model.predict(input_df)[0]
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve()
+    elif len(sys.argv) > 2 and sys.argv[1] == "--batch":
+        run_batch(sys.argv[2])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--check-parity":
+        sys.exit(0 if check_parity() else 1)
+    else:
+        # ✅ One-shot mode: get input from Node.js (JSON string → dict)
+        input_dict = json.loads(sys.argv[1])
+        pred, prob0, prob1 = predict_symptoms(input_dict)
 
-# ✅ Step 9: Print output (Node.js will read this line)
-print(pred, probs[0], probs[1])
+        # ✅ Step 6: Print output (Node.js will read this line)
+        print(pred, prob0, prob1)
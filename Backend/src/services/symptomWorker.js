@@ -0,0 +1,246 @@
+import { spawn } from 'child_process';
+import path from 'path';
+import readline from 'readline';
+import { fileURLToPath } from 'url';
+
+// Get current directory for ES modules
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+// Symptom worker configuration
+const SYMPTOM_WORKER_CONFIG = {
+    pythonCommand: process.env.SYMPTOM_PYTHON || 'python',
+    scriptPath: path.join(__dirname, 'predict.py'),
+    requestTimeout: 15000, // 15 seconds per prediction
+    startupTimeout: 60000, // 60 seconds for the worker to load the model and report ready
+    restartDelay: 2000 // 2 seconds before respawning a crashed worker
+};
+
+// Global worker state
+let worker = null;
+let workerReady = null;
+let lastWorkerFailure = 0;
+let nextRequestId = 1;
+const pendingRequests = new Map();
+
+const logger = {
+    info: (message, data = null) => console.log(`[INFO] ${new Date().toISOString()} - ${message}`, data || ''),
+    error: (message, error = null) => console.error(`[ERROR] ${new Date().toISOString()} - ${message}`, error || ''),
+    warn: (message, data = null) => console.warn(`[WARN] ${new Date().toISOString()} - ${message}`, data || '')
+};
+
+const rejectAllPending = (error) => {
+    for (const { reject, timer } of pendingRequests.values()) {
+        clearTimeout(timer);
+        reject(error);
+    }
+    pendingRequests.clear();
+};
+
+// Start the long-lived predict.py --serve process (model is unpickled once)
+const startSymptomWorker = () => {
+    if (workerReady) return workerReady;
+
+    // Callers fall back to one-shot predictions until a crashed worker may be respawned
+    const sinceFailure = Date.now() - lastWorkerFailure;
+    if (sinceFailure < SYMPTOM_WORKER_CONFIG.restartDelay) {
+        return Promise.reject(new Error(`Symptom worker restarting in ${SYMPTOM_WORKER_CONFIG.restartDelay - sinceFailure} ms`));
+    }
+
+    let child = null;
+    const ready = new Promise((resolve, reject) => {
+        logger.info('Starting persistent symptom model worker...');
+
+        child = spawn(SYMPTOM_WORKER_CONFIG.pythonCommand, [SYMPTOM_WORKER_CONFIG.scriptPath, '--serve']);
+        worker = child;
+
+        const startupTimer = setTimeout(() => {
+            reject(new Error(`Symptom worker not ready after ${SYMPTOM_WORKER_CONFIG.startupTimeout} ms`));
+            child.kill();
+        }, SYMPTOM_WORKER_CONFIG.startupTimeout);
+
+        const lines = readline.createInterface({ input: child.stdout });
+        lines.on('line', (line) => {
+            let message;
+            try {
+                message = JSON.parse(line);
+            } catch (error) {
+                logger.warn('Ignoring non-JSON output from symptom worker', line);
+                return;
+            }
+
+            if (message.ready) {
+                clearTimeout(startupTimer);
+                logger.info('Symptom model worker ready');
+                resolve(child);
+                return;
+            }
+
+            const pending = pendingRequests.get(message.id);
+            if (!pending) return;
+            pendingRequests.delete(message.id);
+            clearTimeout(pending.timer);
+
+            if (message.error) {
+                pending.reject(new Error(message.error));
+            } else {
+                pending.resolve(message);
+            }
+        });
+
+        child.stderr.on('data', (err) => {
+            console.error("Python Error:", err.toString());
+        });
+
+        // A write to a worker that has died fails with EPIPE; without a listener it crashes Node.
+        // Rejecting the waiting requests sends their callers to the one-shot fallback, and the
+        // broken worker is dropped so the next request starts a fresh one.
+        child.stdin.on('error', (error) => {
+            logger.error('Symptom worker stdin failed', error);
+            if (worker === child) {
+                worker = null;
+                workerReady = null;
+                lastWorkerFailure = Date.now();
+            }
+            child.kill();
+            rejectAllPending(new Error(`Symptom worker stdin failed: ${error.message}`));
+        });
+
+        child.on('error', (error) => {
+            clearTimeout(startupTimer);
+            logger.error('Symptom worker failed to start', error);
+            reject(error);
+        });
+
+        child.on('exit', (code) => {
+            clearTimeout(startupTimer);
+            logger.warn(`Symptom worker exited with code ${code}`);
+            // A worker stopped by stopSymptomWorker is no longer the current one
+            if (worker === child) {
+                worker = null;
+                workerReady = null;
+                lastWorkerFailure = Date.now();
+            }
+            reject(new Error('Symptom worker exited before becoming ready'));
+            rejectAllPending(new Error('Symptom worker exited'));
+        });
+    });
+
+    // Avoid unhandled rejections; callers see the error through predictWithWorker. Only this
+    // worker's state is cleared, never that of a newer worker started since
+    ready.catch(() => {
+        if (workerReady === ready) {
+            workerReady = null;
+            lastWorkerFailure = Date.now();
+        }
+        if (worker === child) {
+            worker = null;
+        }
+    });
+
+    workerReady = ready;
+    return ready;
+};
+
+const toPrediction = (result) => ({
+    pred: result.prediction,
+    pneuProb: result.probabilities[0],
+    tbProb: result.probabilities[1]
+});
+
+// Send one request line to the persistent worker and wait for its matching response
+const sendToWorker = async (payload) => {
+    const child = await startSymptomWorker();
+    const id = nextRequestId++;
+
+    return new Promise((resolve, reject) => {
+        const timer = setTimeout(() => {
+            pendingRequests.delete(id);
+            reject(new Error('Symptom prediction timed out'));
+        }, SYMPTOM_WORKER_CONFIG.requestTimeout);
+
+        pendingRequests.set(id, { resolve, reject, timer });
+        child.stdin.write(JSON.stringify({ id, ...payload }) + '\n');
+    });
+};
+
+// Send one symptom dict to the persistent worker
+const predictWithWorker = async (input) => toPrediction(await sendToWorker({ input }));
+
+// Predict many symptom dicts with a single vectorized forest pass
+const predictBatchWithWorker = async (inputs) => {
+    const message = await sendToWorker({ inputs });
+    return message.results.map(toPrediction);
+};
+
+// Fallback: spawn predict.py once for this request (original behaviour)
+const predictOneShot = (input) => new Promise((resolve, reject) => {
+    const py = spawn(SYMPTOM_WORKER_CONFIG.pythonCommand, [SYMPTOM_WORKER_CONFIG.scriptPath, JSON.stringify(input)]);
+
+    let result = "";
+
+    py.stdout.on("data", (data) => {
+        result += data.toString();
+    });
+
+    py.stderr.on("data", (err) => {
+        console.error("Python Error:", err.toString());
+    });
+
+    py.on("error", reject);
+
+    py.on("close", () => {
+        try {
+            const lines = result.trim().split("\n");
+            const lastLine = lines[lines.length - 1];
+            const [pred, pneuProb, tbProb] = lastLine.split(" ");
+            resolve({ pred, pneuProb: parseFloat(pneuProb), tbProb: parseFloat(tbProb) });
+        } catch (err) {
+            reject(err);
+        }
+    });
+});
+
+// Predict with the persistent worker, falling back to a one-shot process
+const predictSymptoms = async (input) => {
+    try {
+        return await predictWithWorker(input);
+    } catch (error) {
+        logger.warn('Symptom worker unavailable, falling back to one-shot prediction', error.message);
+        return await predictOneShot(input);
+    }
+};
+
+// Batch prediction with the persistent worker, falling back to one-shot processes
+// (one at a time, so a large batch does not spawn a process per record at once)
+const predictSymptomsBatch = async (inputs) => {
+    try {
+        return await predictBatchWithWorker(inputs);
+    } catch (error) {
+        logger.warn('Symptom worker unavailable, falling back to one-shot batch prediction', error.message);
+        const predictions = [];
+        for (const input of inputs) {
+            predictions.push(await predictOneShot(input));
+        }
+        return predictions;
+    }
+};
+
+const stopSymptomWorker = () => {
+    if (worker) {
+        worker.stdin.end();
+        worker.kill();
+        worker = null;
+        workerReady = null;
+        logger.info("Symptom model worker stopped");
+    }
+};
+
+export {
+    startSymptomWorker,
+    predictSymptoms,
+    predictSymptomsBatch,
+    predictOneShot,
+    stopSymptomWorker,
+    SYMPTOM_WORKER_CONFIG
+};
@@ -1,24 +1,117 @@
+import time
+STARTUP_STARTED = time.perf_counter()
+
 import os
 import numpy as np
-import tensorflow as tf
-from flask import Flask, request, jsonify
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.applications import VGG16
-from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout
-from tensorflow.keras.metrics import Precision, Recall
-from PIL import Image
+from flask import Flask, Response, g, request, jsonify
 import io
 import tempfile
 import re
-import requests
+import threading
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from batching import MicroBatcher
+from cascade import TriageCascade, REJECTED_NOT_XRAY, SCREENED_NEGATIVE, ESCALATED
+from prediction_cache import PredictionCache, hash_image_bytes, hash_image_file
+from preprocessing import ImageTooLarge, decode_image, decode_pyramid, resize_image, image_to_array
+from image_fetcher import ImageFetcher
+from weights_downloader import WeightsDownloader
+from metrics import MetricsRegistry
+from json_provider import FastJSONProvider
+
+# Per-process TF thread pools (set per worker by serve.py; 0 = TensorFlow default)
+TF_INTRA_OP_THREADS = int(os.environ.get('TF_INTRA_OP_THREADS', 0))
+TF_INTER_OP_THREADS = int(os.environ.get('TF_INTER_OP_THREADS', 0))
+
+def import_model_libraries():
+    """
+    Import TensorFlow, Keras and the modules built on them. Deferred to model loading
+    because importing TensorFlow alone takes seconds, during which nothing could answer.
+    """
+    global tf, Sequential, VGG16, GlobalAveragePooling2D, Dense, Dropout, Precision, Recall
+    global model_store, tfjs_models, tta, quantization
+    started = time.perf_counter()
+    import tensorflow as tf
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.applications import VGG16
+    from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout
+    from tensorflow.keras.metrics import Precision, Recall
+    import model_store
+    import tfjs_models
+    import tta
+    import quantization
+    
+    if TF_INTRA_OP_THREADS:
+        tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_OP_THREADS)
+    if TF_INTER_OP_THREADS:
+        tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_OP_THREADS)
+    record_startup_phase('tensorflow_import_s', started)
 
 app = Flask(__name__)
+# jsonify through orjson when installed, without key sorting otherwise
+app.json = FastJSONProvider(app)
+
+# Seconds spent in each startup phase, reported at the end of startup and on /health
+startup_timings = {'imports_s': time.perf_counter() - STARTUP_STARTED}
+
+def record_startup_phase(name, started):
+    startup_timings[name] = time.perf_counter() - started
 
 # EXACT SAME CONSTANTS AS YOUR TRAINING
 IMAGE_SIZE = 224  # From your notebook
 BATCH_SIZE = 32   # From your notebook
 
+# Decision thresholds on the sigmoid outputs (the original, hardcoded value was 0.5)
+TB_THRESHOLD = float(os.environ.get('TB_THRESHOLD', 0.5))
+PNEUMONIA_THRESHOLD = float(os.environ.get('PNEUMONIA_THRESHOLD', 0.5))
+
+# Draft-mode JPEG decode and box reduction for large images (set FAST_DECODE=0 for the exact original path)
+FAST_DECODE = os.environ.get('FAST_DECODE', '1') == '1'
+# Full-array min/max logging of every preprocessed image (costs two passes over the array)
+DEBUG_PREPROCESSING = os.environ.get('DEBUG_PREPROCESSING', '0') == '1'
+
+# Pooled image downloads for URL predictions
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', 32 * 1024 * 1024))
+FETCH_TIMEOUT_SECONDS = float(os.environ.get('FETCH_TIMEOUT_SECONDS', 15))
+FETCH_POOL_SIZE = int(os.environ.get('FETCH_POOL_SIZE', 16))
+FETCH_MAX_CONCURRENCY = int(os.environ.get('FETCH_MAX_CONCURRENCY', 8))
+
+# Request and decode limits: the whole request body (answered with a 413 before it is read),
+# the pixels of one decoded image (checked from the header, before decoding) and the
+# number of decodes running at once, which bounds the full-resolution buffers alive together
+MAX_REQUEST_BYTES = int(os.environ.get('MAX_REQUEST_BYTES', 64 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 50_000_000))
+MAX_CONCURRENT_DECODES = int(os.environ.get('MAX_CONCURRENT_DECODES', os.cpu_count() or 4))
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+decode_slots = threading.BoundedSemaphore(MAX_CONCURRENT_DECODES)
+
+image_fetcher = ImageFetcher(
+    max_bytes=MAX_IMAGE_BYTES,
+    timeout=FETCH_TIMEOUT_SECONDS,
+    pool_size=FETCH_POOL_SIZE,
+    max_concurrency=FETCH_MAX_CONCURRENCY
+)
+
+# Per-request progress printing (set VERBOSE_LOGGING=0 in production; /metrics has the numbers)
+VERBOSE_LOGGING = os.environ.get('VERBOSE_LOGGING', '1') == '1'
+
+def log(message):
+    if VERBOSE_LOGGING:
+        print(message)
+
+# Prometheus-style metrics served on /metrics
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram('pyserver_request_duration_seconds', 'End-to-end request latency', ['endpoint'])
+REQUESTS = metrics.counter('pyserver_requests_total', 'Requests by endpoint and HTTP status', ['endpoint', 'status'])
+STAGE_SECONDS = metrics.histogram('pyserver_stage_duration_seconds',
+                                  'Time per stage: fetch, read, decode, resize, normalize, augment, inference, serialization', ['stage'])
+FORWARD_SECONDS = metrics.histogram('pyserver_forward_duration_seconds', 'Forward pass time per model (or fused/compiled path)', ['model'])
+FORWARD_BATCH_SIZE = metrics.histogram('pyserver_forward_batch_size', 'Images per forward pass',
+                                       buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+ERRORS = metrics.counter('pyserver_errors_total', 'Failures by stage', ['stage'])
+CASCADE_EXITS = metrics.counter('pyserver_cascade_exits_total', 'Images by the triage cascade stage they exited at', ['stage'])
+
 def convert_gdrive_url(share_url):
     """
     Convert Google Drive share URL to direct download URL
@@ -38,84 +131,48 @@ def convert_gdrive_url(share_url):
 
 def download_model_weights(url, local_path):
     """
-    Download model weights from URL to local file with Google Drive support
+    Download model weights from URL to local file with Google Drive support.
+    Streams into a temp file, resumes interrupted downloads and only accepts a
+    cached file whose SHA-256 matches the recorded (and, when configured, expected) one.
     """
     try:
         print(f"Downloading weights from: {url}")
         print(f"Saving to: {local_path}")
         
-        # Check if file already exists
-        if os.path.exists(local_path):
-            file_size = os.path.getsize(local_path)
-            print(f"File already exists ({file_size} bytes), skipping download")
-            return local_path
-        
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(local_path) if os.path.dirname(local_path) else '.', exist_ok=True)
-        
         # Convert Google Drive URL if needed
         download_url = convert_gdrive_url(url)
-        print(f"Using download URL: {download_url}")
-        
-        # Start session for Google Drive downloads
-        session = requests.Session()
-        
-        # First request to get the file
-        response = session.get(download_url, stream=True, timeout=60)
-        
-        # Handle Google Drive virus scan warning for large files
-        if 'virus scan warning' in response.text.lower() or 'download_warning' in response.text:
-            print("Detected Google Drive virus scan warning, extracting confirm token...")
-            
-            # Look for the confirm token
-            for line in response.text.split('\n'):
-                if 'confirm=' in line and 'download' in line:
-                    try:
-                        confirm_token = line.split('confirm=')[1].split('&')[0].split('"')[0]
-                        print(f"Found confirm token: {confirm_token}")
-                        
-                        # Make second request with confirm token
-                        params = {'confirm': confirm_token, 'id': download_url.split('id=')[1]}
-                        response = session.get('https://drive.google.com/uc', params=params, stream=True, timeout=120)
-                        break
-                    except:
-                        continue
-        
-        response.raise_for_status()
-        
-        # Download with progress
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded_size = 0
-        
-        with open(local_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded_size += len(chunk)
-                    if total_size > 0:
-                        progress = (downloaded_size / total_size) * 100
-                        print(f"\rDownload progress: {progress:.1f}%", end='', flush=True)
-        
-        print(f"\n✓ Download completed: {downloaded_size} bytes")
-        
-        # Verify the file is not empty and is likely a valid model file
-        if downloaded_size < 1000:  # Less than 1KB is suspicious
-            print(f"⚠️ Warning: Downloaded file is very small ({downloaded_size} bytes)")
-            with open(local_path, 'r') as f:
-                content = f.read()[:500]  # Read first 500 chars
-                if 'html' in content.lower() or 'error' in content.lower():
-                    print("Downloaded file appears to be HTML (likely an error page)")
-                    os.remove(local_path)
-                    return None
-        
-        return local_path
+        return weights_downloader.download(download_url, local_path, WEIGHTS_SHA256.get(local_path))
         
     except Exception as e:
         print(f"❌ Failed to download weights: {e}")
-        if os.path.exists(local_path):
-            os.remove(local_path)
         return None
 
+def model_needs_weights(model_name):
+    """
+    Whether loading model_name will go through the build + weight download path
+    """
+    if MOCK_WEIGHTS or MODEL_SOURCE == 'store':
+        return False
+    if QUANTIZED_MODE and os.path.exists(quantization.quantized_artifact_path(MODEL_STORE_DIR, model_name, QUANTIZED_MODE)):
+        return False
+    return MODEL_SOURCE == 'build' or not model_store.has_model(MODEL_STORE_DIR, model_name)
+
+def prefetch_model_weights(models):
+    """
+    Download the weights of every (url, model_name, local_path) that needs them in parallel
+    before the models are built one after the other; the builds then find verified cached files.
+    """
+    jobs = [(convert_gdrive_url(url), local_path, WEIGHTS_SHA256.get(local_path))
+            for url, model_name, local_path in models if model_needs_weights(model_name)]
+    if not jobs:
+        return
+    print(f"⬇️ Downloading {len(jobs)} weight files in parallel...")
+    started = time.perf_counter()
+    for (_, local_path, _), result in zip(jobs, weights_downloader.download_many(jobs)):
+        if isinstance(result, Exception):
+            print(f"❌ Failed to download {local_path}: {result}")
+    record_startup_phase('weights_download_s', started)
+
 def sanitize_model_name(name):
     """
     Sanitize model name to match TensorFlow scope name requirements:
@@ -137,7 +194,7 @@ def build_exact_binary_model(model_name="binary_model"):
     safe_name = sanitize_model_name(model_name)
     
     base_vgg16 = VGG16(
-        weights='imagenet',
+        weights=None if MOCK_WEIGHTS else 'imagenet',
         include_top=False,
         input_shape=(IMAGE_SIZE, IMAGE_SIZE, 3)
     )
@@ -172,16 +229,22 @@ def load_model_with_weights_download(weights_url, model_name, local_filename):
     try:
         print(f"Loading {model_name}...")
         
-        # Download weights if not already present
-        downloaded_path = download_model_weights(weights_url, local_filename)
-        if downloaded_path is None:
-            raise Exception("Failed to download model weights")
-        
-        # Build the exact same architecture with sanitized name
-        model = build_exact_binary_model(model_name)
-        
-        # Load the weights from local file
-        model.load_weights(downloaded_path)
+        if MOCK_WEIGHTS:
+            # Same seed for every model, so the backbones match like the real ImageNet ones
+            print(f"⚠️ MOCK_WEIGHTS=1: {model_name} uses random weights, predictions are meaningless")
+            tf.keras.utils.set_random_seed(0)
+            model = build_exact_binary_model(model_name)
+        else:
+            # Download weights if not already present
+            downloaded_path = download_model_weights(weights_url, local_filename)
+            if downloaded_path is None:
+                raise Exception("Failed to download model weights")
+            
+            # Build the exact same architecture with sanitized name
+            model = build_exact_binary_model(model_name)
+            
+            # Load the weights from local file
+            model.load_weights(downloaded_path)
         
         print(f"✓ {model_name} loaded successfully")
         print(f"  Model input shape: {model.input_shape}")
@@ -197,174 +260,885 @@ def load_model_with_weights_download(weights_url, model_name, local_filename):
         print(f"❌ Failed to load {model_name}: {e}")
         return None
 
-def preprocess_image_from_bytes(image_bytes):
+def load_model_for_serving(weights_url, model_name, local_filename):
     """
-    Preprocess image from raw bytes with exact same preprocessing as training
+    Load a model according to MODEL_SOURCE: from the local checksum-verified model store
+    (inference-only, no ImageNet download, no build, no compile), or through the
+    build + weight download path. A store failure only falls back to building when
+    MODEL_BUILD_FALLBACK=1.
+    """
+    use_store = MODEL_SOURCE == 'store' or (
+        MODEL_SOURCE == 'auto' and model_store.has_model(MODEL_STORE_DIR, model_name)
+    )
+    
+    if use_store:
+        try:
+            print(f"Loading {model_name} from model store {MODEL_STORE_DIR}...")
+            model, timings = model_store.load_model(MODEL_STORE_DIR, model_name)
+            startup_timings[f'{model_name}_verify_s'] = timings['verify_s']
+            startup_timings[f'{model_name}_deserialize_s'] = timings['deserialize_s']
+            model_versions[model_name] = model_store.read_manifest(MODEL_STORE_DIR)[model_name]['sha256'][:16]
+            print(f"✓ {model_name} loaded from store (verify {timings['verify_s']:.2f}s, "
+                  f"deserialize {timings['deserialize_s']:.2f}s)")
+            return model
+        except Exception as e:
+            print(f"❌ Failed to load {model_name} from model store: {e}")
+            if not MODEL_BUILD_FALLBACK:
+                return None
+            print(f"⚠️ Falling back to build + download for {model_name} (MODEL_BUILD_FALLBACK=1)")
+    
+    started = time.perf_counter()
+    model = load_model_with_weights_download(weights_url, model_name, local_filename)
+    record_startup_phase(f'{model_name}_build_and_download_s', started)
+    if model is not None and MOCK_WEIGHTS:
+        model_versions[model_name] = 'mock'
+    elif model is not None:
+        model_versions[model_name] = f"{os.path.getsize(local_filename)}-{int(os.path.getmtime(local_filename))}"
+    return model
+
+def load_quantized_model_for_serving(weights_url, model_name, local_filename):
+    """
+    Load the QUANTIZED_MODE TFLite version of a model from the model store, converting
+    (and calibrating, for int8) from the float32 model once if the artifact is missing.
+    The float32 model is released afterwards so only the quantized copy stays in memory.
     """
     try:
-        print(f"Processing image from bytes, size: {len(image_bytes)} bytes")
-        
-        # Create BytesIO object from bytes
-        img_buffer = io.BytesIO(image_bytes)
-        
-        # Open image from buffer
-        img = Image.open(img_buffer)
-        
-        print(f"Image opened successfully - mode: {img.mode}, size: {img.size}")
-        
-        # Convert to RGB if necessary (handles RGBA, grayscale, etc.)
-        if img.mode != 'RGB':
-            print(f"Converting from {img.mode} to RGB")
-            img = img.convert('RGB')
+        path = quantization.quantized_artifact_path(MODEL_STORE_DIR, model_name, QUANTIZED_MODE)
         
-        # Resize to target size
-        img = img.resize((IMAGE_SIZE, IMAGE_SIZE))
-        print(f"Image resized to: {img.size}")
+        if not os.path.exists(path):
+            print(f"No {QUANTIZED_MODE} artifact for {model_name}, converting from float32...")
+            float_model = load_model_for_serving(weights_url, model_name, local_filename)
+            if float_model is None:
+                raise Exception("Failed to load float32 model for conversion")
+            
+            calibration = None
+            if QUANTIZED_MODE == 'int8':
+                if not QUANTIZATION_CALIBRATION_DIR:
+                    raise Exception("int8 quantization needs QUANTIZATION_CALIBRATION_DIR")
+                calibration = quantization.load_image_dir(QUANTIZATION_CALIBRATION_DIR, IMAGE_SIZE, limit=200)
+                print(f"  Calibrating on {len(calibration)} representative images")
+            
+            started = time.perf_counter()
+            model_content = quantization.convert_model(float_model, QUANTIZED_MODE, calibration)
+            quantization.save_quantized_model(model_content, MODEL_STORE_DIR, model_name, QUANTIZED_MODE)
+            record_startup_phase(f'{model_name}_quantize_s', started)
+            del float_model
+        
+        # Memory-mapped by TFLite, so pre-forked workers share the weight pages
+        model = quantization.TFLiteBinaryModel(name=model_name, num_threads=TFLITE_NUM_THREADS, model_path=path)
+        model_versions[model_name] = f"{QUANTIZED_MODE}-{model_store.sha256_file(path)[:16]}"
+        print(f"✓ {model_name} loaded in {QUANTIZED_MODE} quantized mode ({model.model_bytes / 1e6:.1f} MB)")
+        return model
         
-        # Convert to numpy array
-        img_array = np.array(img, dtype=np.float32)
+    except Exception as e:
+        print(f"❌ Failed to load quantized {model_name}: {e}")
+        return None
+
+def layers_have_identical_weights(layer_a, layer_b):
+    """
+    Check that two layers hold byte-identical weights (same dtype, shape and bytes)
+    """
+    weights_a = layer_a.get_weights()
+    weights_b = layer_b.get_weights()
+    if len(weights_a) != len(weights_b):
+        return False
+    for a, b in zip(weights_a, weights_b):
+        if a.dtype != b.dtype or a.shape != b.shape or a.tobytes() != b.tobytes():
+            return False
+    return True
+
+def estimate_layer_flops(layer):
+    """
+    Estimate forward-pass FLOPs (multiply + add) of a single layer for one image
+    """
+    output_shape = layer.get_output_shape_at(0)
+    if isinstance(layer, tf.keras.layers.Conv2D):
+        kernel_h, kernel_w, in_channels, out_channels = layer.kernel.shape
+        out_h, out_w = output_shape[1], output_shape[2]
+        return 2 * out_h * out_w * kernel_h * kernel_w * in_channels * out_channels
+    if isinstance(layer, tf.keras.layers.Dense):
+        in_units, out_units = layer.kernel.shape
+        return 2 * in_units * out_units
+    return 0
+
+def build_fused_binary_model(tb_model, pneumonia_model):
+    """
+    Build a two-headed model that runs the shared frozen VGG16 prefix once and
+    branches into the fine-tuned block5 tails and dense heads of both models.
+    Returns None if the models do not share a byte-identical prefix.
+    """
+    try:
+        tb_base = tb_model.layers[0]
+        pneumonia_base = pneumonia_model.layers[0]
+
+        if len(tb_base.layers) != len(pneumonia_base.layers):
+            print("⚠️ Fused model disabled: backbones have different depths")
+            return None
+
+        # Find the longest run of layers with identical weights
+        split_index = 0
+        for tb_layer, pneumonia_layer in zip(tb_base.layers, pneumonia_base.layers):
+            if not layers_have_identical_weights(tb_layer, pneumonia_layer):
+                break
+            split_index += 1
+
+        # The frozen layers (everything but the last 4) must all be shared
+        frozen_count = len(tb_base.layers) - 4
+        if split_index < frozen_count:
+            print(f"⚠️ Fused model disabled: layer '{tb_base.layers[split_index].name}' "
+                  f"differs between models inside the frozen prefix")
+            return None
+
+        # Always keep the fine-tuned tails separate, even if they happen to match
+        split_index = frozen_count
+        print(f"✓ Shared backbone verified: {split_index - 1} layers byte-identical "
+              f"(up to '{tb_base.layers[split_index - 1].name}')")
+
+        # Per-image FLOPs saved by running the shared prefix once
+        shared_flops = sum(estimate_layer_flops(layer) for layer in tb_base.layers[1:split_index])
+        separate_flops = sum(estimate_layer_flops(layer) for layer in tb_base.layers[1:])
+        separate_flops += sum(estimate_layer_flops(layer) for layer in pneumonia_base.layers[1:])
+        separate_flops += sum(estimate_layer_flops(layer) for layer in tb_model.layers[1:])
+        separate_flops += sum(estimate_layer_flops(layer) for layer in pneumonia_model.layers[1:])
+
+        inputs = tf.keras.Input(shape=(IMAGE_SIZE, IMAGE_SIZE, 3), name='xray_input')
+        shared = inputs
+        for layer in tb_base.layers[1:split_index]:
+            shared = layer(shared)
+
+        # Each tail gets its own sub-model since both backbones use the same layer names
+        outputs = []
+        for base, model in ((tb_base, tb_model), (pneumonia_base, pneumonia_model)):
+            tail = Sequential(base.layers[split_index:] + model.layers[1:], name=f"{model.name}_tail")
+            outputs.append(tail(shared))
+
+        fused_model = tf.keras.Model(inputs=inputs, outputs=outputs, name='Fused_TB_Pneumonia_Model')
+
+        print(f"  FLOPs per image: {separate_flops / 1e9:.2f} GFLOPs separate -> "
+              f"{(separate_flops - shared_flops) / 1e9:.2f} GFLOPs fused "
+              f"(saves {shared_flops / 1e9:.2f} GFLOPs, {shared_flops / separate_flops * 100:.1f}%)")
+
+        # Measure the latency actually saved on this machine
+        dummy_img = np.zeros((1, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+        separate_ms = time_inference(lambda: (tb_model(dummy_img, training=False),
+                                              pneumonia_model(dummy_img, training=False)))
+        fused_ms = time_inference(lambda: fused_model(dummy_img, training=False))
+        print(f"  Latency per image: {separate_ms:.1f} ms separate -> {fused_ms:.1f} ms fused "
+              f"(saves {separate_ms - fused_ms:.1f} ms)")
+
+        return fused_model
+
+    except Exception as e:
+        print(f"❌ Failed to build fused model: {e}")
+        return None
+
+def time_inference(run_once, repeats=5):
+    """
+    Return the median wall time in milliseconds of run_once after one warm-up call
+    """
+    run_once()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run_once()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def build_inference_function(tb_model, pneumonia_model, fused_model=None):
+    """
+    Trace a tf.function with a fixed (None, IMAGE_SIZE, IMAGE_SIZE, 3) float32 signature
+    that returns the TB and Pneumonia probabilities of a batch in a single call.
+    Skips the data adapter and callback setup that model.predict() does on every call.
+    """
+    input_signature = [tf.TensorSpec(shape=(None, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=tf.float32)]
+
+    @tf.function(input_signature=input_signature)
+    def infer(images):
+        if fused_model is not None:
+            tb_pred, pneumonia_pred = fused_model(images, training=False)
+        else:
+            tb_pred = tb_model(images, training=False)
+            pneumonia_pred = pneumonia_model(images, training=False)
+        return tb_pred[:, 0], pneumonia_pred[:, 0]
+
+    # Warm up: trace the graph once so the first request doesn't pay for it
+    start = time.perf_counter()
+    infer(tf.zeros((1, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=tf.float32))
+    print(f"✓ Compiled inference function traced and warmed up in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    return infer
+
+def build_xray_validation_function(xray_model):
+    """
+    Trace the X-ray validation model on (None, IMAGE_SIZE, IMAGE_SIZE, 3) batches,
+    resizing to its own input size inside the graph
+    """
+    size = xray_model.input_shape[1:3]
+    input_signature = [tf.TensorSpec(shape=(None, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=tf.float32)]
+
+    @tf.function(input_signature=input_signature)
+    def validate(images):
+        return xray_model(tf.image.resize(images, size), training=False)[:, 0]
+
+    validate(tf.zeros((1, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=tf.float32))
+    return validate
+
+def build_screen_function(tb_model, pneumonia_model, fused_model, screen_size):
+    """
+    Trace the binary pair on images downscaled to screen_size: the global-average-pooled
+    VGG16 heads accept any input size, and a 112px screen costs about a quarter of the FLOPs
+    """
+    input_signature = [tf.TensorSpec(shape=(None, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=tf.float32)]
+
+    # Unknown spatial dims, so the models' (None, 224, 224, 3) input spec accepts the smaller images
+    @tf.function(input_signature=[tf.TensorSpec(shape=(None, None, None, 3), dtype=tf.float32)])
+    def run_pair(small):
+        if fused_model is not None:
+            tb_pred, pneumonia_pred = fused_model(small, training=False)
+        else:
+            tb_pred = tb_model(small, training=False)
+            pneumonia_pred = pneumonia_model(small, training=False)
+        return tb_pred[:, 0], pneumonia_pred[:, 0]
+
+    @tf.function(input_signature=input_signature)
+    def screen(images):
+        return run_pair(tf.image.resize(images, (screen_size, screen_size)))
+
+    screen(tf.zeros((1, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=tf.float32))
+    return screen
+
+# tfjs models by directory, so the cascade and /predict_combined share the X-ray model
+tfjs_model_cache = {}
+
+def load_tfjs_model(model_dir):
+    """
+    Load a tfjs layers-model once per directory. Raises FileNotFoundError when weight shards are missing.
+    """
+    model_dir = os.path.abspath(model_dir)
+    if model_dir not in tfjs_model_cache:
+        tfjs_model_cache[model_dir] = tfjs_models.load_layers_model(model_dir)
+    return tfjs_model_cache[model_dir]
+
+def build_combined_function(models):
+    """
+    Trace one function running every combined model on its level of the image pyramid:
+    {size: (None, size, size, 3) batch} -> {name: model output}
+    """
+    sizes = {name: model.input_shape[1] for name, model in models.items()}
+    input_signature = [{size: tf.TensorSpec(shape=(None, size, size, 3), dtype=tf.float32) for size in set(sizes.values())}]
+
+    @tf.function(input_signature=input_signature)
+    def run(levels):
+        return {name: model(levels[sizes[name]], training=False) for name, model in models.items()}
+
+    run({size: tf.zeros((1, size, size, 3), dtype=tf.float32) for size in set(sizes.values())})
+    return run, sizes
+
+def benchmark_inference_paths(tb_model, pneumonia_model, infer, runs=50, batch_size=1):
+    """
+    Compare p50/p99 latency of the model.predict() path against the compiled inference function
+    """
+    img_array = np.random.rand(batch_size, IMAGE_SIZE, IMAGE_SIZE, 3).astype(np.float32)
+
+    def measure(run_once):
+        run_once()
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            run_once()
+            timings.append((time.perf_counter() - start) * 1000)
+        return {
+            'p50_ms': float(np.percentile(timings, 50)),
+            'p99_ms': float(np.percentile(timings, 99))
+        }
+
+    results = {
+        'predict': measure(lambda: (tb_model.predict(img_array, verbose=0),
+                                    pneumonia_model.predict(img_array, verbose=0))),
+        'compiled': measure(lambda: [t.numpy() for t in infer(img_array)])
+    }
+
+    print(f"📊 Inference latency over {runs} runs (batch size {batch_size}):")
+    for path, stats in results.items():
+        print(f"  {path:>8}: p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms")
+
+    return results
+
+def run_binary_models(tb_model, pneumonia_model, img_array):
+    """
+    Run both binary models on a batch and return (tb_probs, pneumonia_probs) of shape (N,)
+    """
+    FORWARD_BATCH_SIZE.observe(len(img_array))
+    if inference_fn is not None:
+        with FORWARD_SECONDS.time(model='compiled'):
+            tb_probs, pneumonia_probs = inference_fn(tf.convert_to_tensor(img_array, dtype=tf.float32))
+            return tb_probs.numpy(), pneumonia_probs.numpy()
+    if fused_model is not None:
+        with FORWARD_SECONDS.time(model='fused'):
+            tb_pred, pneumonia_pred = fused_model.predict(img_array, verbose=0)
+    else:
+        with FORWARD_SECONDS.time(model='TB_Model'):
+            tb_pred = tb_model.predict(img_array, verbose=0)
+        with FORWARD_SECONDS.time(model='Pneumonia_Model'):
+            pneumonia_pred = pneumonia_model.predict(img_array, verbose=0)
+    return tb_pred[:, 0], pneumonia_pred[:, 0]
+
+def preprocess_image_from_bytes(image_bytes, out=None):
+    """
+    Preprocess image from raw bytes (or an upload stream) with exact same preprocessing as training.
+    When out is given (a (IMAGE_SIZE, IMAGE_SIZE, 3) float32 slot of a batch buffer)
+    the pixels are written straight into it. Raises ImageTooLarge above MAX_IMAGE_PIXELS.
+    """
+    try:
+        log(f"Processing image from {'stream' if hasattr(image_bytes, 'read') else f'bytes, size: {len(image_bytes)} bytes'}")
         
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
+        # Decode (draft/reduced for large images when FAST_DECODE is on) and resize to RGB,
+        # at most MAX_CONCURRENT_DECODES at a time
+        with decode_slots:
+            with STAGE_SECONDS.time(stage='decode'):
+                img = decode_image(image_bytes, IMAGE_SIZE, fast=FAST_DECODE, max_pixels=MAX_IMAGE_PIXELS)
+            with STAGE_SECONDS.time(stage='resize'):
+                img = resize_image(img, IMAGE_SIZE, fast=FAST_DECODE)
+        log(f"Image resized to: {img.size}")
         
         # CRITICAL: Use the EXACT same normalization as your training
         # Your ImageDataGenerator used rescale=1./255
-        img_array = img_array / 255.0
+        with STAGE_SECONDS.time(stage='normalize'):
+            if out is None:
+                img_array = np.empty((1, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+                image_to_array(img, out=img_array[0])
+            else:
+                img_array = image_to_array(img, out=out)[np.newaxis]
         
-        print(f"Image preprocessed successfully - shape: {img_array.shape}, range: [{img_array.min():.3f}, {img_array.max():.3f}]")
+        if DEBUG_PREPROCESSING:
+            print(f"Image preprocessed successfully - shape: {img_array.shape}, range: [{img_array.min():.3f}, {img_array.max():.3f}]")
         
         return img_array
         
+    except ImageTooLarge:
+        ERRORS.inc(stage='limits')
+        raise
     except Exception as e:
+        ERRORS.inc(stage='preprocess')
         print(f"Error preprocessing image from bytes: {e}")
         return None
 
-def preprocess_image_from_file_object(file_obj):
+def fetch_batch_urls(items):
     """
-    Preprocess image from file object (FileStorage) with exact same preprocessing as training
+    Download the URL items that have no bytes, cached result or error yet, concurrently
+    over the shared pool; sets 'image_bytes' or 'error' on each
     """
-    try:
-        print(f"Processing file object: {file_obj}")
-        
-        # Read the file content to bytes
-        file_obj.seek(0)  # Ensure we're at the beginning
-        image_bytes = file_obj.read()
-        
-        print(f"Read {len(image_bytes)} bytes from file object")
-        
-        if len(image_bytes) == 0:
-            raise Exception("File object is empty")
-        
-        # Use the bytes preprocessing function
-        return preprocess_image_from_bytes(image_bytes)
-        
-    except Exception as e:
-        print(f"Error preprocessing image from file object: {e}")
-        return None
+    to_fetch = [item for item in items if item['source'] == 'url'
+                and not ('image_bytes' in item or 'cached' in item or 'error' in item)]
+    if not to_fetch:
+        return
+    
+    with STAGE_SECONDS.time(stage='fetch'):
+        fetched_all = image_fetcher.fetch_many([item['name'] for item in to_fetch])
+    for item, fetched in zip(to_fetch, fetched_all):
+        if isinstance(fetched, Exception):
+            ERRORS.inc(stage='fetch')
+            item['error'] = f'Failed to download image from URL: {fetched}'
+        else:
+            item['image_bytes'] = fetched
+
+def predict_batch_items(items):
+    """
+    Predict a list of items, each a dict with 'source', 'name' and one of 'image_bytes'
+    (bytes or an upload stream), 'cached' (a cached result) or 'error'; URL items with
+    none of them are downloaded here. Items are handled MAX_BATCH_SIZE at a time: the
+    chunk's URLs are fetched, cache hits answered directly, the rest decoded concurrently
+    into one batch buffer and run through both models in a single forward pass, and the
+    chunk's bytes are released before the next one, so at most MAX_BATCH_SIZE downloaded
+    images are held at once. Returns one entry per item, in order, with a result or an error.
+    """
+    entries = [{'index': index, 'source': item['source'], 'name': item['name']} for index, item in enumerate(items)]
+
+    for start in range(0, len(items), MAX_BATCH_SIZE):
+        chunk_items = items[start:start + MAX_BATCH_SIZE]
+        fetch_batch_urls(chunk_items)
+
+        chunk = []  # (entry, image_bytes, image_hash, image_url)
+        for entry, item in zip(entries[start:start + MAX_BATCH_SIZE], chunk_items):
+            if item.get('error'):
+                entry['error'] = item['error']
+                continue
+
+            image_url = item['name'] if item['source'] == 'url' else None
+            if item.get('cached') is not None:
+                entry.update(format_prediction_response(item['cached']))
+                continue
+
+            # Dropped from the item so the bytes are freed once this chunk is done
+            image_bytes = item.pop('image_bytes')
+            result, image_hash = lookup_cached_prediction(image_bytes, image_url)
+            if result is not None:
+                entry.update(format_prediction_response(result))
+                continue
+
+            chunk.append((entry, image_bytes, image_hash, image_url))
+
+        if not chunk:
+            continue
+
+        # Decode every image of the chunk in parallel straight into its batch slot
+        batch = np.zeros((len(chunk), IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+        def decode_into_slot(j):
+            try:
+                return preprocess_image_from_bytes(chunk[j][1], out=batch[j]) is not None
+            except ImageTooLarge as e:
+                chunk[j][0]['error'] = str(e)
+                return False
+
+        decoded = list(decode_executor.map(decode_into_slot, range(len(chunk))))
+
+        valid = [j for j, ok in enumerate(decoded) if ok]
+        for j, ok in enumerate(decoded):
+            if not ok:
+                chunk[j][0].setdefault('error', 'Failed to preprocess image')
+        if not valid:
+            continue
+
+        try:
+            tb_probs, pneumonia_probs, decisions, xray_probs = predict_probabilities_triaged(
+                batch if len(valid) == len(chunk) else batch[valid])
+        except Exception as e:
+            ERRORS.inc(stage='inference')
+            print(f"Batch prediction error: {e}")
+            for j in valid:
+                chunk[j][0]['error'] = 'Prediction failed'
+            continue
+
+        responses, results = build_batch_responses(tb_probs, pneumonia_probs, decisions, xray_probs)
+        for position, j in enumerate(valid):
+            entry, _, image_hash, image_url = chunk[j]
+            store_cached_prediction(image_hash, results[position], image_url)
+            entry.update(responses[position])
+
+    return entries
+
+def upload_stream(file_obj):
+    """
+    The upload's own (spooled) stream, rewound and size-checked, so it can be hashed and
+    decoded in place instead of being copied into bytes first.
+    Raises ImageTooLarge above MAX_IMAGE_BYTES and ValueError for an empty upload.
+    """
+    stream = file_obj.stream
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    if size > MAX_IMAGE_BYTES:
+        ERRORS.inc(stage='limits')
+        raise ImageTooLarge(f"Upload is {size} bytes, limit is {MAX_IMAGE_BYTES} bytes")
+    if size == 0:
+        raise ValueError("File object is empty")
+    return stream
 
 def download_image_from_url(image_url):
     """
     Download image from URL (e.g., Cloudinary) and return as bytes
     """
     try:
-        print(f"Downloading image from URL: {image_url}")
+        log(f"Downloading image from URL: {image_url}")
         
-        headers = {
-            'User-Agent': 'ChestGuard-Python-Server/1.0'
-        }
-        
-        response = requests.get(image_url, headers=headers, timeout=15)
-        response.raise_for_status()
-        
-        image_bytes = response.content
-        print(f"Downloaded {len(image_bytes)} bytes from URL")
-        
-        if len(image_bytes) == 0:
-            raise Exception("Downloaded image is empty")
+        # Pooled keep-alive session, streamed with a size cap and bounded concurrency
+        with STAGE_SECONDS.time(stage='fetch'):
+            image_bytes = image_fetcher.fetch(image_url)
+        log(f"Downloaded {len(image_bytes)} bytes from URL")
         
         return image_bytes
         
     except Exception as e:
+        ERRORS.inc(stage='fetch')
         print(f"Error downloading image from URL: {e}")
         return None
 
-def predict_with_exact_models_from_array(tb_model, pneumonia_model, img_array):
+def predict_probabilities(img_array):
+    """
+    Run a preprocessed batch through both models, via the micro-batcher when enabled.
+    Returns (tb_probs, pneumonia_probs) of shape (N,)
+    """
+    with STAGE_SECONDS.time(stage='inference'):
+        if prediction_batcher is not None:
+            return prediction_batcher.submit(img_array)
+        return run_binary_models(tb_model, pneumonia_model, img_array)
+
+@lru_cache(maxsize=None)
+def tta_view_parameters(views):
+    return tta.view_parameters(views, TTA_MAX_SHIFT, TTA_SCALE_RANGE, TTA_CONTRAST_RANGE, TTA_SEED)
+
+def predict_with_tta(img_array, views):
+    """
+    Predict one preprocessed image from `views` augmented views (shift, scale, contrast)
+    run as a single batched forward pass; returns the mean probabilities plus their variance
+    """
+    with STAGE_SECONDS.time(stage='augment'):
+        batch = tta.augment_views(img_array, tta_view_parameters(views))
+    
+    tb_probs, pneumonia_probs = predict_probabilities(batch)
+    tb_mean, tb_variance = tta.summarize_views(tb_probs, views)
+    pneumonia_mean, pneumonia_variance = tta.summarize_views(pneumonia_probs, views)
+    
+    log(f"TTA predictions over {views} views - TB: {tb_mean[0]:.4f} (var {tb_variance[0]:.5f}), "
+        f"Pneumonia: {pneumonia_mean[0]:.4f} (var {pneumonia_variance[0]:.5f})")
+    
+    result = build_prediction_result(float(tb_mean[0]), float(pneumonia_mean[0]))
+    result.update({
+        'tta_views': views,
+        'tb_variance': float(tb_variance[0]),
+        'pneumonia_variance': float(pneumonia_variance[0])
+    })
+    return result
+
+def predict_probabilities_triaged(img_array):
+    """
+    Run a preprocessed batch through the triage cascade when enabled: non-X-rays are
+    rejected by the X-ray validation model, confident negatives exit after the downscaled
+    screen, and only the rest reach the full-size pair.
+    Returns (tb_probs, pneumonia_probs, decisions, xray_probs); decisions and xray_probs
+    are None without the cascade, probabilities are NaN for rejected images.
+    """
+    if triage is None:
+        tb_probs, pneumonia_probs = predict_probabilities(img_array)
+        return tb_probs, pneumonia_probs, None, None
+    
+    count = len(img_array)
+    decisions = np.full(count, ESCALATED, dtype=object)
+    tb_probs = np.full(count, np.nan, dtype=np.float32)
+    pneumonia_probs = np.full(count, np.nan, dtype=np.float32)
+    images = tf.convert_to_tensor(img_array, dtype=tf.float32)
+    
+    xray_probs = None
+    if xray_validation_fn is not None:
+        with FORWARD_SECONDS.time(model='xray_validation'):
+            xray_probs = xray_validation_fn(images).numpy()
+        decisions[triage.rejects(xray_probs)] = REJECTED_NOT_XRAY
+    
+    remaining = np.flatnonzero(decisions == ESCALATED)
+    if screen_fn is not None and len(remaining):
+        with FORWARD_SECONDS.time(model='screen'):
+            screen_tb, screen_pneumonia = screen_fn(tf.gather(images, remaining))
+        screen_tb, screen_pneumonia = screen_tb.numpy(), screen_pneumonia.numpy()
+        negative = triage.negatives(screen_tb, screen_pneumonia)
+        tb_probs[remaining[negative]] = screen_tb[negative]
+        pneumonia_probs[remaining[negative]] = screen_pneumonia[negative]
+        decisions[remaining[negative]] = SCREENED_NEGATIVE
+        remaining = remaining[~negative]
+    
+    if len(remaining):
+        full_tb, full_pneumonia = predict_probabilities(img_array if len(remaining) == count else img_array[remaining])
+        tb_probs[remaining] = full_tb
+        pneumonia_probs[remaining] = full_pneumonia
+    
+    triage.record(decisions)
+    for decision in decisions:
+        CASCADE_EXITS.inc(stage=decision)
+    
+    return tb_probs, pneumonia_probs, decisions, xray_probs
+
+def build_triage_info(decision, xray_prob):
+    triage_info = {'decision': decision}
+    if xray_prob is not None:
+        triage_info['xray_confidence'] = float(xray_prob)
+    return triage_info
+
+def build_triaged_result(tb_disease_prob, pneumonia_disease_prob, decision, xray_prob):
     """
-    Make predictions using preprocessed image array
+    Prediction result for one image of a triaged batch; rejected images only carry the triage info
+    """
+    if decision is None:
+        return build_prediction_result(tb_disease_prob, pneumonia_disease_prob)
+    
+    triage_info = build_triage_info(decision, xray_prob)
+    if decision == REJECTED_NOT_XRAY:
+        return {'rejected': True, 'triage': triage_info}
+    
+    result = build_prediction_result(tb_disease_prob, pneumonia_disease_prob)
+    result['triage'] = triage_info
+    return result
+
+def predict_with_exact_models_from_array(tb_model, pneumonia_model, img_array, tta_views=0):
+    """
+    Make predictions using preprocessed image array (averaged over tta_views augmented views when > 1)
     """
     try:
-        print(f"Making predictions with preprocessed array - shape: {img_array.shape}")
+        log(f"Making predictions with preprocessed array - shape: {img_array.shape}")
+        
+        if tta_views > 1:
+            return predict_with_tta(img_array, tta_views)
         
-        # Get predictions from both models
-        tb_pred = tb_model.predict(img_array, verbose=0)[0]
-        pneumonia_pred = pneumonia_model.predict(img_array, verbose=0)[0]
+        # Get predictions from both models (coalesced with concurrent requests when enabled),
+        # behind the triage cascade when it is enabled
+        tb_probs, pneumonia_probs, decisions, xray_probs = predict_probabilities_triaged(img_array)
+        if decisions is not None:
+            log(f"Triage decision: {decisions[0]}")
         
         # Extract probabilities (your models output single sigmoid value)
-        tb_disease_prob = float(tb_pred[0])  # Probability of TB
-        pneumonia_disease_prob = float(pneumonia_pred[0])  # Probability of Pneumonia
+        tb_disease_prob = float(tb_probs[0])  # Probability of TB
+        pneumonia_disease_prob = float(pneumonia_probs[0])  # Probability of Pneumonia
         
-        print(f"Raw predictions - TB: {tb_disease_prob:.4f}, Pneumonia: {pneumonia_disease_prob:.4f}")
+        log(f"Raw predictions - TB: {tb_disease_prob:.4f}, Pneumonia: {pneumonia_disease_prob:.4f}")
         
-        return {
-            'tb_confidence': tb_disease_prob,
-            'pneumonia_confidence': pneumonia_disease_prob,
-            'tb_prediction': 'TB Detected' if tb_disease_prob > 0.5 else 'Normal',
-            'pneumonia_prediction': 'Pneumonia Detected' if pneumonia_disease_prob > 0.5 else 'Normal'
-        }
+        return build_triaged_result(tb_disease_prob, pneumonia_disease_prob,
+                                    None if decisions is None else decisions[0],
+                                    None if xray_probs is None else xray_probs[0])
         
     except Exception as e:
+        ERRORS.inc(stage='inference')
         print(f"Prediction error: {e}")
         return None
 
+def build_prediction_result(tb_disease_prob, pneumonia_disease_prob):
+    """
+    Build the prediction result dict from the raw TB and Pneumonia probabilities
+    """
+    return {
+        'tb_confidence': tb_disease_prob,
+        'pneumonia_confidence': pneumonia_disease_prob,
+        'tb_prediction': 'TB Detected' if tb_disease_prob > TB_THRESHOLD else 'Normal',
+        'pneumonia_prediction': 'Pneumonia Detected' if pneumonia_disease_prob > PNEUMONIA_THRESHOLD else 'Normal'
+    }
+
+def build_cached_result(cached):
+    """
+    Prediction result from a cache entry (tb_prob, pneumonia_prob, triage)
+    """
+    tb_disease_prob, pneumonia_disease_prob, triage_info = cached
+    result = build_prediction_result(tb_disease_prob, pneumonia_disease_prob)
+    if triage_info:
+        result['triage'] = triage_info
+    return result
+
+def lookup_cached_prediction(image_bytes, image_url=None):
+    """
+    Look up raw image bytes (or an upload stream) in the prediction cache.
+    Returns (result or None, image_hash) - the hash is reused to store a fresh result.
+    """
+    if prediction_cache is None:
+        return None, None
+    
+    image_hash = hash_image_file(image_bytes) if hasattr(image_bytes, 'read') else hash_image_bytes(image_bytes)
+    probs = prediction_cache.get(image_hash)
+    if probs is None:
+        return None, image_hash
+    
+    if image_url:
+        prediction_cache.remember_url(image_url, image_hash)
+    log(f"⚡ Prediction cache hit for image {image_hash[:12]}")
+    return build_cached_result(probs), image_hash
+
+def store_cached_prediction(image_hash, result, image_url=None):
+    """
+    Store the raw probabilities of a fresh prediction, and its triage decision, in the cache
+    """
+    if prediction_cache is not None and image_hash is not None and not result.get('rejected'):
+        prediction_cache.put(image_hash, result['tb_confidence'], result['pneumonia_confidence'],
+                             image_url=image_url, triage=result.get('triage'))
+
+def predict_from_url(image_url, tta_views=0):
+    """
+    Download, preprocess and predict an image URL, answering repeats from the cache
+    (TTA predictions are neither looked up nor stored)
+    """
+    use_cache = tta_views <= 1
+    
+    # Shortcut: a URL we have already predicted needs no download at all
+    if prediction_cache is not None and use_cache:
+        image_hash, probs = prediction_cache.get_by_url(image_url)
+        if probs is not None:
+            log(f"⚡ Prediction cache hit for URL (image {image_hash[:12]})")
+            return process_and_return_result(build_cached_result(probs))
+    
+    # Download image from URL
+    image_bytes = download_image_from_url(image_url)
+    if image_bytes is None:
+        return jsonify({'error': 'Failed to download image from URL'}), 400
+    
+    result, image_hash = lookup_cached_prediction(image_bytes, image_url) if use_cache else (None, None)
+    if result is None:
+        # Preprocess image from bytes
+        img_array = preprocess_image_from_bytes(image_bytes)
+        if img_array is None:
+            return jsonify({'error': 'Failed to preprocess image from URL'}), 400
+        
+        # Make prediction
+        result = predict_with_exact_models_from_array(tb_model, pneumonia_model, img_array, tta_views)
+        
+        if result is None:
+            return jsonify({'error': 'Prediction failed'}), 500
+        
+        store_cached_prediction(image_hash, result, image_url)
+    
+    # Process and return result
+    return process_and_return_result(result)
+
+# (final_diagnosis, recommendation) indexed by tb_detected + 2 * pneumonia_detected
+DIAGNOSES = [
+    ("Normal Chest X-Ray", "No significant pathology detected"),
+    ("Tuberculosis Detected", "TB screening, sputum test recommended"),
+    ("Pneumonia Detected", "Antibiotic treatment consideration"),
+    ("Multiple Conditions Detected", "Possible co-infection - requires urgent medical review")
+]
+
+def format_prediction_responses(tb_probs, pneumonia_probs):
+    """
+    Response payloads for a whole batch: thresholds, normal confidence (1 - max disease
+    confidence), rounding and the diagnosis run vectorized over (N,) or (N, 1) probability
+    arrays, and everything is converted to Python values in one tolist() per column
+    """
+    tb = np.asarray(tb_probs, dtype=np.float64).reshape(-1)
+    pneumonia = np.asarray(pneumonia_probs, dtype=np.float64).reshape(-1)
+    tb_detected = tb > TB_THRESHOLD
+    pneumonia_detected = pneumonia > PNEUMONIA_THRESHOLD
+    diagnoses = tb_detected + 2 * pneumonia_detected
+    
+    columns = zip(
+        np.round(tb * 100, 2).tolist(),
+        np.round(pneumonia * 100, 2).tolist(),
+        np.round((1 - np.maximum(tb, pneumonia)) * 100, 2).tolist(),
+        tb_detected.tolist(),
+        pneumonia_detected.tolist(),
+        diagnoses.tolist()
+    )
+    return [{
+        'tuberculosis_confidence': tb_confidence,
+        'pneumonia_confidence': pneumonia_confidence,
+        'normal_confidence': normal_confidence,
+        'tb_prediction': 'TB Detected' if tb_is_detected else 'Normal',
+        'pneumonia_prediction': 'Pneumonia Detected' if pneumonia_is_detected else 'Normal',
+        'final_diagnosis': DIAGNOSES[diagnosis][0],
+        'recommendation': DIAGNOSES[diagnosis][1],
+        'tb_detected': tb_is_detected,
+        'pneumonia_detected': pneumonia_is_detected
+    } for tb_confidence, pneumonia_confidence, normal_confidence, tb_is_detected, pneumonia_is_detected, diagnosis in columns]
+
+def build_batch_responses(tb_probs, pneumonia_probs, decisions, xray_probs):
+    """
+    Response payloads for a triaged batch, as returned by predict_probabilities_triaged:
+    thresholds, normal confidence and diagnoses in one vectorized pass, with each image's
+    triage info attached; images the cascade rejected get an error instead.
+    Returns (responses, results) - results are the raw prediction results to cache.
+    """
+    responses = format_prediction_responses(tb_probs, pneumonia_probs)
+    tb_values = np.asarray(tb_probs, dtype=np.float64).reshape(-1).tolist()
+    pneumonia_values = np.asarray(pneumonia_probs, dtype=np.float64).reshape(-1).tolist()
+    results = []
+    for position, response in enumerate(responses):
+        decision = None if decisions is None else decisions[position]
+        xray_prob = None if xray_probs is None else xray_probs[position]
+        result = build_triaged_result(tb_values[position], pneumonia_values[position], decision, xray_prob)
+        if result.get('rejected'):
+            responses[position] = {'error': 'Image does not appear to be a chest X-ray', 'triage': result['triage']}
+        elif decision is not None:
+            response['triage'] = result['triage']
+        results.append(result)
+    return responses, results
+
+def format_prediction_response(result):
+    """
+    Build the response payload for a prediction result: the batch formatter run on a
+    batch of one, so single-image and batch responses can never disagree, plus the
+    result's triage and TTA extras
+    """
+    response_data = format_prediction_responses([result['tb_confidence']], [result['pneumonia_confidence']])[0]
+    
+    if 'triage' in result:
+        response_data['triage'] = result['triage']
+    
+    # Spread of the probabilities over the augmented views, as an uncertainty signal
+    if 'tta_views' in result:
+        response_data['tta'] = {
+            'views': result['tta_views'],
+            'tuberculosis_variance': result['tb_variance'],
+            'pneumonia_variance': result['pneumonia_variance']
+        }
+    
+    return response_data
+
+def format_multilabel_response(probs):
+    """
+    Multilabel model output as the Backend reports it: independent sigmoid per class,
+    detected classes above their threshold from multilabel_metadata.json
+    """
+    class_names = multilabel_metadata['model_info']['class_names']
+    top = int(np.argmax(probs))
+    return {
+        'predicted_class': class_names[top],
+        'confidence': round(float(probs[top]) * 100, 2),
+        'class_probabilities': {name: round(float(p) * 100, 2) for name, p in zip(class_names, probs)},
+        'detected': [name for name, p, threshold in zip(class_names, probs, multilabel_thresholds) if p > threshold]
+    }
+
+def format_xray_validation(raw_score):
+    """
+    X-ray validation result with the Backend's rule: X-ray above 0.5, passed when confident enough
+    """
+    raw_score = float(raw_score)
+    is_xray = raw_score > 0.5
+    confidence = raw_score if is_xray else 1 - raw_score
+    return {
+        'is_xray': is_xray,
+        'confidence': round(confidence * 100, 2),
+        'raw_score': round(raw_score, 4),
+        'passed': is_xray and confidence >= XRAY_VALIDATION_THRESHOLD,
+        'threshold': XRAY_VALIDATION_THRESHOLD
+    }
+
+def predict_combined_from_bytes(image_bytes):
+    """
+    Decode the image (bytes or an upload stream) once into a pyramid (224 for the VGG16 pair,
+    the combined models' input sizes) and run every loaded model on it. Returns (payload, status code).
+    """
+    sizes = {IMAGE_SIZE, *combined_input_sizes.values()}
+    try:
+        with decode_slots:
+            with STAGE_SECONDS.time(stage='decode'):
+                levels = decode_pyramid(image_bytes, sizes, fast=FAST_DECODE, max_pixels=MAX_IMAGE_PIXELS)
+        with STAGE_SECONDS.time(stage='normalize'):
+            arrays = {size: image_to_array(img)[np.newaxis] for size, img in levels.items()}
+    except ImageTooLarge:
+        ERRORS.inc(stage='limits')
+        raise
+    except Exception as e:
+        ERRORS.inc(stage='preprocess')
+        print(f"Error preprocessing image from bytes: {e}")
+        return {'error': 'Failed to process image'}, 500
+    
+    result = predict_with_exact_models_from_array(tb_model, pneumonia_model, arrays[IMAGE_SIZE])
+    if result is None:
+        return {'error': 'Failed to process image'}, 500
+    response_data = {'binary': result if result.get('rejected') else format_prediction_response(result)}
+    
+    if combined_fn is not None:
+        with FORWARD_SECONDS.time(model='combined'):
+            outputs = combined_fn({size: tf.constant(arrays[size]) for size in set(combined_input_sizes.values())})
+        if 'multilabel' in outputs:
+            response_data['multilabel'] = format_multilabel_response(outputs['multilabel'].numpy()[0])
+        if 'xray_validation' in outputs:
+            response_data['xray_validation'] = format_xray_validation(outputs['xray_validation'].numpy()[0, 0])
+    
+    if unavailable_models:
+        response_data['unavailable_models'] = dict(unavailable_models)
+    return response_data, 200
+
 def process_and_return_result(result):
     """
     Process prediction result and return formatted response with correct normal calculation
     """
     try:
-        # Get the disease probabilities
-        tb_confidence = result['tb_confidence']
-        pneumonia_confidence = result['pneumonia_confidence']
-        
-        # Calculate normal confidence correctly
-        max_disease_confidence = max(tb_confidence, pneumonia_confidence)
-        normal_confidence = 1 - max_disease_confidence
-        
-        # Determine detections
-        tb_detected = tb_confidence > 0.5
-        pneumonia_detected = pneumonia_confidence > 0.5
-        
-        # Determine final diagnosis
-        if not tb_detected and not pneumonia_detected:
-            final_diagnosis = "Normal Chest X-Ray"
-            recommendation = "No significant pathology detected"
-        elif tb_detected and not pneumonia_detected:
-            final_diagnosis = "Tuberculosis Detected"
-            recommendation = "TB screening, sputum test recommended"
-        elif pneumonia_detected and not tb_detected:
-            final_diagnosis = "Pneumonia Detected"
-            recommendation = "Antibiotic treatment consideration"
-        else:
-            final_diagnosis = "Multiple Conditions Detected"
-            recommendation = "Possible co-infection - requires urgent medical review"
-        
-        response_data = {
-            'tuberculosis_confidence': round(tb_confidence * 100, 2),
-            'pneumonia_confidence': round(pneumonia_confidence * 100, 2),
-            'normal_confidence': round(normal_confidence * 100, 2),
-            'tb_prediction': result['tb_prediction'],
-            'pneumonia_prediction': result['pneumonia_prediction'],
-            'final_diagnosis': final_diagnosis,
-            'recommendation': recommendation,
-            'tb_detected': tb_detected,
-            'pneumonia_detected': pneumonia_detected
-        }
+        if result.get('rejected'):
+            return jsonify({'error': 'Image does not appear to be a chest X-ray', 'triage': result['triage']}), 422
         
-        print(f"✓ Prediction successful: {final_diagnosis}")
-        print(f"  TB: {response_data['tuberculosis_confidence']}%")
-        print(f"  Pneumonia: {response_data['pneumonia_confidence']}%") 
-        print(f"  Normal: {response_data['normal_confidence']}%")
+        response_data = format_prediction_response(result)
+        final_diagnosis = response_data['final_diagnosis']
         
-        return jsonify(response_data)
+        if VERBOSE_LOGGING:
+            print(f"✓ Prediction successful: {final_diagnosis}")
+            print(f"  TB: {response_data['tuberculosis_confidence']}%")
+            print(f"  Pneumonia: {response_data['pneumonia_confidence']}%") 
+            print(f"  Normal: {response_data['normal_confidence']}%")
+        
+        with STAGE_SECONDS.time(stage='serialization'):
+            return jsonify(response_data)
         
     except Exception as e:
         print(f"❌ Error processing result: {e}")
@@ -378,47 +1152,357 @@ PNEUMONIA_WEIGHTS_URL = "https://drive.google.com/file/d/1DVKSu94XYbL6hSDG--Xcam
 TB_WEIGHTS_PATH = "tuberculosis_binary_weights.h5"
 PNEUMONIA_WEIGHTS_PATH = "pneumonia_binary_weights.h5"
 
-# Load models with weight downloading
-print("🏗️ Loading models with weight downloading from Google Drive...")
-tb_model = load_model_with_weights_download(TB_WEIGHTS_URL, "TB_Model", TB_WEIGHTS_PATH)
-pneumonia_model = load_model_with_weights_download(PNEUMONIA_WEIGHTS_URL, "Pneumonia_Model", PNEUMONIA_WEIGHTS_PATH)
+# Expected SHA-256 of each weight file (optional; without it the checksum recorded at download time is used)
+WEIGHTS_SHA256 = {
+    TB_WEIGHTS_PATH: os.environ.get('TB_WEIGHTS_SHA256') or None,
+    PNEUMONIA_WEIGHTS_PATH: os.environ.get('PNEUMONIA_WEIGHTS_SHA256') or None
+}
+WEIGHTS_DOWNLOAD_TIMEOUT = float(os.environ.get('WEIGHTS_DOWNLOAD_TIMEOUT', 60))
+weights_downloader = WeightsDownloader(timeout=WEIGHTS_DOWNLOAD_TIMEOUT)
 
-if tb_model is None or pneumonia_model is None:
-    print("❌ ERROR: Failed to load models. Check your internet connection and URLs.")
-    exit(1)
+# Run the shared frozen VGG16 prefix once for both heads (set FUSED_INFERENCE=0 to disable)
+FUSED_INFERENCE = os.environ.get('FUSED_INFERENCE', '1') == '1'
+
+# Coalesce concurrent requests into one batched forward pass (set MICRO_BATCHING=0 to disable)
+MICRO_BATCHING = os.environ.get('MICRO_BATCHING', '1') == '1'
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', BATCH_SIZE))
+MAX_BATCH_WAIT_MS = float(os.environ.get('MAX_BATCH_WAIT_MS', 5))
+
+# /predict_batch limits: items per request and parallel image decodes
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 500))
+DECODE_WORKERS = int(os.environ.get('DECODE_WORKERS', os.cpu_count() or 4))
+decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='decode')
+
+# Content-addressed cache of raw predictions (set PREDICTION_CACHE=0 to disable)
+PREDICTION_CACHE = os.environ.get('PREDICTION_CACHE', '1') == '1'
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', 10000))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', 24 * 60 * 60))
+PREDICTION_CACHE_PATH = os.environ.get('PREDICTION_CACHE_PATH', '')  # SQLite file, empty = memory only
+
+# Serve through a traced tf.function instead of model.predict() (set COMPILED_INFERENCE=0 to disable)
+COMPILED_INFERENCE = os.environ.get('COMPILED_INFERENCE', '1') == '1'
+
+# Where models come from: 'auto' uses the local model store when it has the model and
+# builds + downloads otherwise, 'store' only uses the store, 'build' never uses it
+MODEL_SOURCE = os.environ.get('MODEL_SOURCE', 'auto')
+MODEL_STORE_DIR = os.environ.get('MODEL_STORE_DIR', 'model_store')
+# Allow a failed store load (missing file, bad checksum) to fall back to build + download
+MODEL_BUILD_FALLBACK = os.environ.get('MODEL_BUILD_FALLBACK', '0') == '1'
+# Export the loaded models into the store (e.g. after the first build + download)
+MODEL_STORE_EXPORT = os.environ.get('MODEL_STORE_EXPORT', '0') == '1'
+# Seeded random weights instead of ImageNet + Drive downloads (offline benchmarks only, use with MODEL_SOURCE=build)
+MOCK_WEIGHTS = os.environ.get('MOCK_WEIGHTS', '0') == '1'
+
+# Opt-in quantized serving through TFLite: 'dynamic', 'float16' or 'int8' (empty = float32)
+QUANTIZED_MODE = os.environ.get('QUANTIZED_MODE', '')
+QUANTIZATION_CALIBRATION_DIR = os.environ.get('QUANTIZATION_CALIBRATION_DIR', '')
+TFLITE_NUM_THREADS = int(os.environ.get('TFLITE_NUM_THREADS', TF_INTRA_OP_THREADS)) or None
 
-print("✅ Models loaded successfully!")
+# Test-time augmentation: average TTA_VIEWS shifted/scaled/contrast-jittered views per image in
+# one batched pass (0 = off). Requests can override it with ?tta=K (or "tta": K in a JSON body)
+TTA_VIEWS = int(os.environ.get('TTA_VIEWS', 0))
+TTA_MAX_VIEWS = int(os.environ.get('TTA_MAX_VIEWS', 32))
+TTA_MAX_SHIFT = float(os.environ.get('TTA_MAX_SHIFT', 0.05))  # fraction of the image size
+TTA_SCALE_RANGE = float(os.environ.get('TTA_SCALE_RANGE', 0.1))
+TTA_CONTRAST_RANGE = float(os.environ.get('TTA_CONTRAST_RANGE', 0.1))
+TTA_SEED = int(os.environ.get('TTA_SEED', 0))
+
+# The Backend's tfjs models (Node serves them from the same directory)
+TRAINED_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Backend', 'src', 'trained_model')
+XRAY_MODEL_DIR = os.environ.get('XRAY_MODEL_DIR', os.path.join(TRAINED_MODEL_DIR, 'bin_xray'))
+MULTILABEL_MODEL_DIR = os.environ.get('MULTILABEL_MODEL_DIR', os.path.join(TRAINED_MODEL_DIR, 'multilabel'))
+
+# /predict_combined: the 150x150 multilabel and X-ray validation models next to the VGG16 pair,
+# all fed from one decode of the image (set COMBINED_MODELS=1 to load them)
+COMBINED_MODELS = os.environ.get('COMBINED_MODELS', '0') == '1'
+XRAY_VALIDATION_THRESHOLD = float(os.environ.get('XRAY_VALIDATION_THRESHOLD', 0.7))  # same as the Backend's check
+
+# Early-exit triage cascade in front of the full-size pair (set CASCADE=1 to enable):
+# the Backend's 150x150 X-ray validation model rejects non-X-rays and a downscaled
+# run of the pair exits confident negatives. Needs every weight shard of the tfjs model.
+CASCADE = os.environ.get('CASCADE', '0') == '1'
+CASCADE_XRAY_MODEL_DIR = os.environ.get('CASCADE_XRAY_MODEL_DIR', XRAY_MODEL_DIR)
+CASCADE_REJECT_BELOW = float(os.environ.get('CASCADE_REJECT_BELOW', 0.2))
+CASCADE_SCREEN_SIZE = int(os.environ.get('CASCADE_SCREEN_SIZE', 112))  # 0 = no downscaled screen
+CASCADE_NEGATIVE_BELOW = float(os.environ.get('CASCADE_NEGATIVE_BELOW', 0.05))
+
+# Load the models in a background thread so the HTTP layer answers while TensorFlow imports
+# and the weights download (set BACKGROUND_LOADING=1). Until they are ready prediction
+# requests wait up to MODEL_READY_WAIT_SECONDS, then get a 503 with Retry-After.
+BACKGROUND_LOADING = os.environ.get('BACKGROUND_LOADING', '0') == '1'
+MODEL_READY_WAIT_SECONDS = float(os.environ.get('MODEL_READY_WAIT_SECONDS', 0))
+MODEL_LOADING_RETRY_AFTER = int(os.environ.get('MODEL_LOADING_RETRY_AFTER', 10))
+# serve.py's preloading master sets WARM_UP_MODELS=0 so no TF/TFLite thread pools exist
+# before it forks; each worker warms up after the fork instead
+WARM_UP_MODELS = os.environ.get('WARM_UP_MODELS', '1') == '1'
+
+# Identity of the loaded weights (store checksum or weight file size + mtime)
+model_versions = {}
+
+# Serving state, filled in by load_models()
+tb_model = None
+pneumonia_model = None
+fused_model = None
+inference_fn = None
+triage = None
+xray_validation_fn = None
+screen_fn = None
+prediction_batcher = None
+prediction_cache = None
+combined_fn = None
+combined_input_sizes = {}
+multilabel_metadata = None
+multilabel_thresholds = []
+# Combined models that could not be loaded, with the reason (e.g. missing weight shards)
+unavailable_models = {}
+
+def load_models():
+    """
+    Import TensorFlow, load both models and build every serving path. Raises on failure.
+    """
+    global tb_model, pneumonia_model, fused_model, inference_fn, triage, xray_validation_fn, screen_fn
+    global prediction_batcher, prediction_cache
+    global combined_fn, combined_input_sizes, multilabel_metadata, multilabel_thresholds
+    import_model_libraries()
+    
+    # Load models from the model store or with weight downloading
+    print(f"🏗️ Loading models (source: {MODEL_SOURCE})...")
+    prefetch_model_weights([
+        (TB_WEIGHTS_URL, "TB_Model", TB_WEIGHTS_PATH),
+        (PNEUMONIA_WEIGHTS_URL, "Pneumonia_Model", PNEUMONIA_WEIGHTS_PATH)
+    ])
+    load_for_serving = load_quantized_model_for_serving if QUANTIZED_MODE else load_model_for_serving
+    tb_model = load_for_serving(TB_WEIGHTS_URL, "TB_Model", TB_WEIGHTS_PATH)
+    pneumonia_model = load_for_serving(PNEUMONIA_WEIGHTS_URL, "Pneumonia_Model", PNEUMONIA_WEIGHTS_PATH)
+
+    if tb_model is None or pneumonia_model is None:
+        raise RuntimeError("Failed to load models. Check your internet connection and URLs.")
+
+    print("✅ Models loaded successfully!")
+
+    if MODEL_STORE_EXPORT and not QUANTIZED_MODE:
+        for model_name, model in (("TB_Model", tb_model), ("Pneumonia_Model", pneumonia_model)):
+            model_store.export_model(model, MODEL_STORE_DIR, model_name)
+
+    # Fused and compiled paths need Keras models; quantized models run through TFLite
+    if FUSED_INFERENCE and not QUANTIZED_MODE:
+        print("🔗 Building fused shared-backbone model...")
+        started = time.perf_counter()
+        fused_model = build_fused_binary_model(tb_model, pneumonia_model)
+        record_startup_phase('fused_build_s', started)
+        if fused_model is None:
+            print("⚠️ Falling back to separate TB and Pneumonia models")
+
+    if COMPILED_INFERENCE and not QUANTIZED_MODE:
+        print("⚙️ Tracing compiled inference function...")
+        started = time.perf_counter()
+        inference_fn = build_inference_function(tb_model, pneumonia_model, fused_model)
+        record_startup_phase('compile_and_warmup_s', started)
+
+    if CASCADE:
+        print("🚦 Building triage cascade...")
+        started = time.perf_counter()
+        try:
+            xray_validation_fn = build_xray_validation_function(load_tfjs_model(CASCADE_XRAY_MODEL_DIR))
+            print(f"✓ X-ray validation stage loaded from {CASCADE_XRAY_MODEL_DIR}")
+        except Exception as e:
+            print(f"⚠️ X-ray validation stage disabled: {e}")
+        if CASCADE_SCREEN_SIZE and not QUANTIZED_MODE:
+            screen_fn = build_screen_function(tb_model, pneumonia_model, fused_model, CASCADE_SCREEN_SIZE)
+            print(f"✓ Negative screen at {CASCADE_SCREEN_SIZE}x{CASCADE_SCREEN_SIZE}")
+        if xray_validation_fn is not None or screen_fn is not None:
+            triage = TriageCascade(reject_below=CASCADE_REJECT_BELOW, negative_below=CASCADE_NEGATIVE_BELOW)
+        else:
+            print("⚠️ Triage cascade disabled: no stage could be built")
+        record_startup_phase('cascade_build_s', started)
+
+    if COMBINED_MODELS and not QUANTIZED_MODE:
+        print("🧩 Loading the multilabel and X-ray validation models for /predict_combined...")
+        started = time.perf_counter()
+        combined_models = {}
+        try:
+            multilabel_metadata = tfjs_models.read_metadata(os.path.join(MULTILABEL_MODEL_DIR, 'multilabel_metadata.json'))
+            model_info = multilabel_metadata['model_info']
+            thresholds = {c['class_index']: c['threshold'] for c in multilabel_metadata.get('disease_config', {}).values()}
+            multilabel_thresholds = [thresholds.get(i, model_info['confidence_threshold']) for i in range(model_info['num_classes'])]
+            combined_models['multilabel'] = load_tfjs_model(MULTILABEL_MODEL_DIR)
+            print(f"✓ Multilabel model loaded from {MULTILABEL_MODEL_DIR} ({', '.join(model_info['class_names'])})")
+        except Exception as e:
+            unavailable_models['multilabel'] = str(e)
+            print(f"⚠️ Multilabel model unavailable: {e}")
+        try:
+            combined_models['xray_validation'] = load_tfjs_model(XRAY_MODEL_DIR)
+            print(f"✓ X-ray validation model loaded from {XRAY_MODEL_DIR}")
+        except Exception as e:
+            unavailable_models['xray_validation'] = str(e)
+            print(f"⚠️ X-ray validation model unavailable: {e}")
+        if combined_models:
+            combined_fn, combined_input_sizes = build_combined_function(combined_models)
+        record_startup_phase('combined_models_s', started)
+
+    if MICRO_BATCHING:
+        prediction_batcher = MicroBatcher(
+            lambda batch: run_binary_models(tb_model, pneumonia_model, batch),
+            max_batch_size=MAX_BATCH_SIZE,
+            max_wait_ms=MAX_BATCH_WAIT_MS
+        )
+        print(f"📦 Micro-batching enabled: up to {MAX_BATCH_SIZE} images or {MAX_BATCH_WAIT_MS} ms per batch")
+
+    if PREDICTION_CACHE:
+        # Namespace entries by the loaded weights so results from older weights are never reused,
+        # by the decode mode, which changes the pixels the models see, and by the cascade's
+        # stages and thresholds, whose exits skip or replace the full pair
+        namespace = [model_versions[name] for name in ("TB_Model", "Pneumonia_Model")]
+        namespace.append('decode-fast' if FAST_DECODE else 'decode-exact')
+        if triage is not None:
+            namespace.append(f"cascade-reject{CASCADE_REJECT_BELOW if xray_validation_fn is not None else '-off'}"
+                             f"-screen{CASCADE_SCREEN_SIZE if screen_fn is not None else 0}@{CASCADE_NEGATIVE_BELOW}")
+        model_version = '|'.join(namespace)
+        prediction_cache = PredictionCache(
+            max_entries=PREDICTION_CACHE_MAX_ENTRIES,
+            ttl_seconds=PREDICTION_CACHE_TTL_SECONDS,
+            persist_path=PREDICTION_CACHE_PATH or None,
+            model_version=model_version
+        )
+        print(f"🗃️ Prediction cache enabled: {PREDICTION_CACHE_MAX_ENTRIES} entries, "
+              f"TTL {PREDICTION_CACHE_TTL_SECONDS:.0f}s, {'persisted to ' + PREDICTION_CACHE_PATH if PREDICTION_CACHE_PATH else 'memory only'}")
+
+def warm_up_models():
+    """
+    Run a random image through the serving path (compiled function, micro-batcher,
+    cascade) so the first real request does not pay for tracing and kernel setup.
+    Returns (result, seconds).
+    """
+    started = time.perf_counter()
+    dummy_img = np.random.rand(1, IMAGE_SIZE, IMAGE_SIZE, 3).astype(np.float32) / 255.0
+    result = predict_with_exact_models_from_array(tb_model, pneumonia_model, dummy_img)
+    return result, time.perf_counter() - started
+
+def print_startup_timings():
+    startup_timings['total_s'] = time.perf_counter() - STARTUP_STARTED
+    print("⏱️ Startup timings:")
+    for phase, seconds in startup_timings.items():
+        print(f"  {phase}: {seconds:.2f}s")
+
+# Loading state: 'loading', 'ready' or 'failed' (with the error); models_ready is set once ready
+model_state = {'status': 'loading', 'error': None}
+models_ready = threading.Event()
+
+def load_and_warm_up_models():
+    """
+    Load the models and warm them up, then mark the server ready. Failures are recorded in
+    model_state instead of exiting, so /health can report them.
+    """
+    try:
+        load_models()
+        if WARM_UP_MODELS:
+            started = time.perf_counter()
+            result, _ = warm_up_models()
+            if result is None:
+                raise RuntimeError("Warm-up prediction failed")
+            record_startup_phase('warmup_s', started)
+    except Exception as e:
+        model_state.update(status='failed', error=str(e))
+        print(f"❌ ERROR: {e}")
+        return False
+    
+    model_state['status'] = 'ready'
+    models_ready.set()
+    print_startup_timings()
+    return True
+
+# Queue, batching and cache state is read from the components at scrape time
+metrics.gauge('pyserver_batch_queue_depth', 'Requests waiting for the micro-batcher',
+              lambda: prediction_batcher.queue_depth() if prediction_batcher is not None else None)
+metrics.gauge('pyserver_micro_batches_total', 'Forward passes run by the micro-batcher',
+              lambda: prediction_batcher.stats()['batches_run'] if prediction_batcher is not None else None,
+              metric_type='counter')
+metrics.gauge('pyserver_prediction_cache_entries', 'Predictions held in the in-memory cache',
+              lambda: prediction_cache.stats()['entries'] if prediction_cache is not None else None)
+metrics.gauge('pyserver_prediction_cache_lookups_total', 'Prediction cache lookups by result',
+              lambda: None if prediction_cache is None else {
+                  (result,): prediction_cache.stats()[key]
+                  for result, key in (('hit', 'hits'), ('miss', 'misses'), ('url_hit', 'url_hits'), ('disk_hit', 'disk_hits'))
+              }, labelnames=['result'], metric_type='counter')
+metrics.gauge('pyserver_startup_seconds', 'Seconds spent in each startup phase',
+              lambda: {(phase,): seconds for phase, seconds in startup_timings.items()}, labelnames=['phase'])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+# Endpoints that need the models; everything else answers while they load
+MODEL_ENDPOINTS = {'predict', 'predict_url', 'predict_batch', 'predict_combined', 'test_models'}
+
+@app.before_request
+def require_loaded_models():
+    if request.endpoint not in MODEL_ENDPOINTS or models_ready.wait(MODEL_READY_WAIT_SECONDS):
+        return None
+    
+    if model_state['status'] == 'failed':
+        return jsonify({'error': 'Models failed to load', 'details': model_state['error']}), 503
+    response = jsonify({'error': 'Models are still loading, retry later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(MODEL_LOADING_RETRY_AFTER)
+    return response
+
+@app.before_request
+def parse_request_body():
+    # Parse the body here, outside the endpoints' catch-all handlers, so a body over
+    # MAX_REQUEST_BYTES (with or without Content-Length) is answered with a 413
+    if request.endpoint in MODEL_ENDPOINTS and request.method == 'POST':
+        if request.is_json:
+            request.get_json(silent=True)
+        else:
+            request.files
+
+@app.errorhandler(413)
+def request_too_large(e):
+    ERRORS.inc(stage='limits')
+    return jsonify({'error': f'Request exceeds the {MAX_REQUEST_BYTES} byte limit'}), 413
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or 'unknown'
+    if endpoint != 'metrics_endpoint':
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+def requested_tta_views():
+    """
+    TTA views for this request: ?tta=K or "tta": K in a JSON body, else TTA_VIEWS.
+    Raises ValueError for values that are not integers in 0..TTA_MAX_VIEWS.
+    """
+    value = request.args.get('tta')
+    if value is None and request.is_json:
+        value = (request.get_json(silent=True) or {}).get('tta')
+    if value is None:
+        return TTA_VIEWS
+    
+    views = int(value)
+    if not 0 <= views <= TTA_MAX_VIEWS:
+        raise ValueError(f"tta must be between 0 and {TTA_MAX_VIEWS}")
+    return views
 
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        print(f"Received prediction request - Content-Type: {request.content_type}")
+        log(f"Received prediction request - Content-Type: {request.content_type}")
+        
+        try:
+            tta_views = requested_tta_views()
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid tta: {e}'}), 400
         
         # Method 1: Handle direct URL in request body (JSON)
         if request.is_json:
             data = request.get_json()
             if 'url' in data:
                 image_url = data['url']
-                print(f"Processing prediction from URL: {image_url}")
-                
-                # Download image from URL
-                image_bytes = download_image_from_url(image_url)
-                if image_bytes is None:
-                    return jsonify({'error': 'Failed to download image from URL'}), 400
-                
-                # Preprocess image from bytes
-                img_array = preprocess_image_from_bytes(image_bytes)
-                if img_array is None:
-                    return jsonify({'error': 'Failed to preprocess image from URL'}), 400
+                log(f"Processing prediction from URL: {image_url}")
                 
-                # Make prediction
-                result = predict_with_exact_models_from_array(tb_model, pneumonia_model, img_array)
-                
-                if result is None:
-                    return jsonify({'error': 'Prediction failed'}), 500
-                
-                # Process and return result
-                return process_and_return_result(result)
+                return predict_from_url(image_url, tta_views)
         
         # Method 2: Handle file upload
         if 'file' not in request.files:
@@ -428,18 +1512,29 @@ def predict():
         if img_file.filename == '':
             return jsonify({'error': 'Empty filename'}), 400
 
-        print(f"Received file: {img_file.filename}, content type: {img_file.content_type}")
+        log(f"Received file: {img_file.filename}, content type: {img_file.content_type}")
         
-        # Try to preprocess directly from file object
-        img_array = preprocess_image_from_file_object(img_file)
+        # Hashed and decoded straight from the upload's spooled stream, never copied into bytes
+        try:
+            image_stream = upload_stream(img_file)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if img_array is not None:
-            result = predict_with_exact_models_from_array(tb_model, pneumonia_model, img_array)
-            if result:
-                return process_and_return_result(result)
+        with STAGE_SECONDS.time(stage='read'):
+            result, image_hash = lookup_cached_prediction(image_stream) if tta_views <= 1 else (None, None)
+        if result is None:
+            img_array = preprocess_image_from_bytes(image_stream)
+            if img_array is not None:
+                result = predict_with_exact_models_from_array(tb_model, pneumonia_model, img_array, tta_views)
+                if result:
+                    store_cached_prediction(image_hash, result)
+        if result:
+            return process_and_return_result(result)
         
         return jsonify({'error': 'Failed to process image'}), 500
-            
+    
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         print(f"❌ Prediction endpoint failed with exception: {str(e)}")
         return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
@@ -458,65 +1553,200 @@ def predict_url():
             return jsonify({'error': 'URL is required in request body'}), 400
         
         image_url = data['url']
-        print(f"Direct URL prediction request: {image_url}")
-        
-        # Download image from URL
-        image_bytes = download_image_from_url(image_url)
-        if image_bytes is None:
-            return jsonify({'error': 'Failed to download image from URL'}), 400
-        
-        # Preprocess image from bytes
-        img_array = preprocess_image_from_bytes(image_bytes)
-        if img_array is None:
-            return jsonify({'error': 'Failed to preprocess image from URL'}), 400
-        
-        # Make prediction
-        result = predict_with_exact_models_from_array(tb_model, pneumonia_model, img_array)
-        
-        if result is None:
-            return jsonify({'error': 'Prediction failed'}), 500
+        log(f"Direct URL prediction request: {image_url}")
         
-        return process_and_return_result(result)
+        try:
+            tta_views = requested_tta_views()
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid tta: {e}'}), 400
         
+        return predict_from_url(image_url, tta_views)
+    
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         print(f"❌ URL prediction failed: {str(e)}")
         return jsonify({'error': f'URL prediction failed: {str(e)}'}), 500
 
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """
+    Batch endpoint: any number of uploaded files (field 'files' or 'file') and/or a list
+    of image URLs ('urls' in a JSON body, or repeated 'urls' form fields).
+    Returns per-item results and per-item errors in submission order (files first).
+    """
+    try:
+        files = request.files.getlist('files') + request.files.getlist('file')
+        if request.is_json:
+            urls = (request.get_json(silent=True) or {}).get('urls', [])
+        else:
+            urls = request.form.getlist('urls')
+        if isinstance(urls, str):
+            urls = [urls]
+        
+        # Reject before any upload is read or URL fetched
+        if not files and not urls:
+            return jsonify({'error': 'No files uploaded and no URLs provided'}), 400
+        if len(files) + len(urls) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'Too many items: {len(files) + len(urls)} (limit {MAX_BATCH_ITEMS})'}), 400
+        
+        items = []
+        for img_file in files:
+            item = {'source': 'file', 'name': img_file.filename}
+            try:
+                item['image_bytes'] = upload_stream(img_file)
+            except ImageTooLarge as e:
+                item['error'] = str(e)
+            except ValueError:
+                item['error'] = 'Failed to read uploaded file'
+            items.append(item)
+        
+        # URLs predicted before need no download; the rest are fetched chunk by chunk in predict_batch_items
+        url_items = []
+        for image_url in urls:
+            item = {'source': 'url', 'name': image_url}
+            if prediction_cache is not None:
+                _, probs = prediction_cache.get_by_url(image_url)
+                if probs is not None:
+                    item['cached'] = build_cached_result(probs)
+            url_items.append(item)
+        items.extend(url_items)
+        
+        log(f"Batch prediction request: {len(items)} items ({len(items) - len(url_items)} files, {len(url_items)} URLs)")
+        
+        results = predict_batch_items(items)
+        failed = sum(1 for entry in results if 'error' in entry)
+        
+        log(f"✓ Batch prediction finished: {len(results) - failed} succeeded, {failed} failed")
+        
+        with STAGE_SECONDS.time(stage='serialization'):
+            return jsonify({
+                'count': len(results),
+                'succeeded': len(results) - failed,
+                'failed': failed,
+                'results': results
+            })
+        
+    except Exception as e:
+        print(f"❌ Batch prediction failed: {str(e)}")
+        return jsonify({'error': f'Batch prediction failed: {str(e)}'}), 500
+
+@app.route('/predict_combined', methods=['POST'])
+def predict_combined():
+    """
+    One decode, every model: the VGG16 pair plus the multilabel and X-ray validation
+    models when loaded (COMBINED_MODELS=1). Accepts a file upload or a JSON {"url": ...}.
+    """
+    try:
+        if request.is_json:
+            image_url = (request.get_json(silent=True) or {}).get('url')
+            if not image_url:
+                return jsonify({'error': 'No URL provided'}), 400
+            image_bytes = download_image_from_url(image_url)
+            if image_bytes is None:
+                return jsonify({'error': 'Failed to download image from URL'}), 400
+        elif 'file' in request.files and request.files['file'].filename != '':
+            try:
+                image_bytes = upload_stream(request.files['file'])
+            except ValueError:
+                return jsonify({'error': 'Failed to read uploaded file'}), 400
+        else:
+            return jsonify({'error': 'No file uploaded and no URL provided'}), 400
+        
+        payload, status = predict_combined_from_bytes(image_bytes)
+        with STAGE_SECONDS.time(stage='serialization'):
+            return jsonify(payload), status
+    
+    except ImageTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        print(f"❌ Combined prediction failed with exception: {str(e)}")
+        return jsonify({'error': f'Combined prediction failed: {str(e)}'}), 500
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: the process is serving; fails only when model loading failed for good, so it gets restarted"""
+    if model_state['status'] == 'failed':
+        return jsonify({'status': 'failed', 'error': model_state['error']}), 503
+    return jsonify({'status': 'alive'})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: the models are loaded and warmed up"""
+    return jsonify({'status': model_state['status'], 'ready': models_ready.is_set()}), 200 if models_ready.is_set() else 503
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
-        'status': 'healthy', 
+        'status': 'healthy' if models_ready.is_set() else model_state['status'],
+        'ready': models_ready.is_set(),
+        'loading_error': model_state['error'],
         'models_loaded': tb_model is not None and pneumonia_model is not None,
+        'fused_inference': fused_model is not None,
+        'compiled_inference': inference_fn is not None,
+        'micro_batching': prediction_batcher.stats() if prediction_batcher is not None else None,
+        'prediction_cache': prediction_cache.stats() if prediction_cache is not None else None,
+        'model_source': MODEL_SOURCE,
+        'quantized_mode': QUANTIZED_MODE or None,
+        'mock_weights': MOCK_WEIGHTS,
+        'tta': {'default_views': TTA_VIEWS, 'max_views': TTA_MAX_VIEWS},
+        'cascade': triage.stats() if triage is not None else None,
+        'limits': {
+            'max_request_bytes': MAX_REQUEST_BYTES,
+            'max_image_bytes': MAX_IMAGE_BYTES,
+            'max_image_pixels': MAX_IMAGE_PIXELS,
+            'max_concurrent_decodes': MAX_CONCURRENT_DECODES
+        },
+        'combined_models': {
+            'loaded': sorted(combined_input_sizes),
+            'unavailable': unavailable_models
+        } if COMBINED_MODELS else None,
+        'startup_timings': startup_timings,
         'model_info': {
             'image_size': IMAGE_SIZE,
             'preprocessing': 'rescale_1_over_255',
             'architecture': 'VGG16_with_custom_head',
-            'normal_calculation': 'inverse_of_max_disease_confidence'
+            'normal_calculation': 'inverse_of_max_disease_confidence',
+            'thresholds': {'tuberculosis': TB_THRESHOLD, 'pneumonia': PNEUMONIA_THRESHOLD}
         },
         'supported_methods': [
             'file_upload',
             'url_prediction',
+            'batch_prediction',
+            'combined_prediction',
             'direct_bytes'
         ]
-    })
+    }), 200 if models_ready.is_set() else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition of request, stage, forward, batching, cache and error metrics"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/test', methods=['GET'])
 def test_models():
-    """Test endpoint to verify models are working"""
+    """Warm-up endpoint: run a random image through the serving path and report how long it took"""
     try:
-        # Create a dummy image for testing
-        dummy_img = np.random.rand(1, IMAGE_SIZE, IMAGE_SIZE, 3).astype(np.float32) / 255.0
-        
-        result = predict_with_exact_models_from_array(tb_model, pneumonia_model, dummy_img)
+        result, seconds = warm_up_models()
         
         if result:
-            return process_and_return_result(result)
+            return jsonify({
+                'test_status': 'passed',
+                'warmup_seconds': seconds,
+                'prediction': format_prediction_response(result)
+            })
         else:
             return jsonify({'test_status': 'failed', 'error': 'Prediction failed'}), 500
             
     except Exception as e:
         return jsonify({'test_status': 'error', 'error': str(e)}), 500
 
+if BACKGROUND_LOADING:
+    print("🧵 Loading models in the background; /health/ready reports when they are ready")
+    threading.Thread(target=load_and_warm_up_models, name='model-loader', daemon=True).start()
+elif not load_and_warm_up_models():
+    exit(1)
+
 if __name__ == '__main__':
     print("🚀 Starting Flask app with Google Drive weight downloading...")
     print(f"📊 Model configuration:")
@@ -525,13 +1755,9 @@ if __name__ == '__main__':
     print(f"  - Architecture: VGG16 + custom head with dropout")
     print(f"  - Output: Single sigmoid for binary classification")
     print(f"  - Normal calculation: 100% - max(disease_confidences)")
+    print(f"  - Fused shared backbone: {'loading' if not models_ready.is_set() else 'enabled' if fused_model is not None else 'disabled'}")
     print(f"  - Weight source: Google Drive")
     
-    # Check if models loaded successfully before starting server
-    if tb_model is None or pneumonia_model is None:
-        print("❌ CRITICAL ERROR: Models failed to load!")
-        exit(1)
-    
     app.run(
         debug=False,
         host='0.0.0.0',
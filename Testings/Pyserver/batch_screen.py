@@ -0,0 +1,214 @@
+"""
+Offline batch screening of X-ray archives, without the HTTP server.
+
+Walks a directory (recursively) or reads a manifest (one path per line, or a CSV
+with a 'path' column; relative paths are relative to the manifest), decodes
+images in a pool of worker processes and runs them through the same models,
+preprocessing and response formatting as app.py in batches. At most --prefetch
+decoded batches are in flight, so memory stays bounded on any archive size.
+
+Results are appended to --output (.jsonl or .csv) after every batch. Rerunning
+the same command resumes: paths already screened are skipped, including images
+the triage cascade rejected as not being X-rays, while paths that failed to decode
+or predict are retried (a later record supersedes the error).
+
+Usage:
+  python batch_screen.py INPUT --output results.jsonl [--batch-size 32] [--workers N] [--prefetch 4]
+
+Model loading follows app.py's environment settings (MODEL_SOURCE, QUANTIZED_MODE,
+CASCADE, ...); per-request logging, micro-batching and the prediction cache are off.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from cascade import REJECTED_NOT_XRAY
+from preprocessing import decode_and_resize
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+CSV_FIELDS = ['path', 'error', 'tuberculosis_confidence', 'pneumonia_confidence', 'normal_confidence',
+              'final_diagnosis', 'tb_detected', 'pneumonia_detected', 'triage_decision']
+
+
+def list_images(input_path):
+    if os.path.isdir(input_path):
+        paths = []
+        for root, dirs, files in os.walk(input_path):
+            dirs.sort()
+            paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(IMAGE_EXTENSIONS))
+        return paths
+
+    base = os.path.dirname(input_path)
+    with open(input_path, newline='') as f:
+        if input_path.lower().endswith('.csv'):
+            names = [row['path'] for row in csv.DictReader(f) if row.get('path')]
+        else:
+            names = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [name if os.path.isabs(name) else os.path.join(base, name) for name in names]
+
+
+def truncate_partial_line(path):
+    # An interrupted run may have left half a line at the end; drop it before appending
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end != len(data):
+            f.truncate(end)
+
+
+def completed_paths(output_path):
+    # Predictions and cascade rejections are final; decode and inference failures are retried
+    if not os.path.exists(output_path):
+        return set()
+    truncate_partial_line(output_path)
+    with open(output_path, newline='', encoding='utf-8') as f:
+        if output_path.lower().endswith('.csv'):
+            return {row['path'] for row in csv.DictReader(f)
+                    if not row.get('error') or row.get('triage_decision') == REJECTED_NOT_XRAY}
+        records = (json.loads(line) for line in f if line.strip())
+        return {record['path'] for record in records
+                if not record.get('error') or (record.get('triage') or {}).get('decision') == REJECTED_NOT_XRAY}
+
+
+def decode_batch(paths, image_size, fast):
+    """
+    Worker process: decode and resize a batch to uint8 (N, size, size, 3); uint8 keeps the
+    transfer back to the parent at a quarter of float32. Returns (pixels, errors).
+    """
+    pixels = np.zeros((len(paths), image_size, image_size, 3), dtype=np.uint8)
+    errors = [None] * len(paths)
+    for i, path in enumerate(paths):
+        try:
+            with open(path, 'rb') as f:
+                pixels[i] = np.asarray(decode_and_resize(f.read(), image_size, fast=fast))
+        except Exception as e:
+            errors[i] = f"Failed to preprocess image: {e}"
+    return pixels, errors
+
+
+class ResultWriter:
+    def __init__(self, output_path):
+        self.is_csv = output_path.lower().endswith('.csv')
+        write_header = self.is_csv and (not os.path.exists(output_path) or os.path.getsize(output_path) == 0)
+        self.file = open(output_path, 'a', newline='', encoding='utf-8')
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            if write_header:
+                self.writer.writeheader()
+
+    def write(self, records):
+        for record in records:
+            if self.is_csv:
+                row = dict(record)
+                row['triage_decision'] = (record.get('triage') or {}).get('decision')
+                self.writer.writerow(row)
+            else:
+                self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def screen_batch(app, paths, pixels, errors):
+    """
+    Run the decodable images of a batch through the models; returns one record per path
+    """
+    records = [{'path': path} for path in paths]
+    valid = [i for i, error in enumerate(errors) if error is None]
+    for i, error in enumerate(errors):
+        if error is not None:
+            records[i]['error'] = error
+    if not valid:
+        return records
+
+    # Same float32 scaling as preprocessing.image_to_array
+    batch = np.divide(pixels[valid], np.float32(255.0), dtype=np.float32)
+    try:
+        tb_probs, pneumonia_probs, decisions, xray_probs = app.predict_probabilities_triaged(batch)
+    except Exception as e:
+        for i in valid:
+            records[i]['error'] = f"Prediction failed: {e}"
+        return records
+
+    responses, _ = app.build_batch_responses(tb_probs, pneumonia_probs, decisions, xray_probs)
+    for position, i in enumerate(valid):
+        records[i].update(responses[position])
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='directory of images, or a manifest (.txt/.csv)')
+    parser.add_argument('--output', required=True, help='results file, .jsonl or .csv (appended to on resume)')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='decode processes')
+    parser.add_argument('--prefetch', type=int, default=4, help='decoded batches in flight')
+    parser.add_argument('--progress-interval', type=float, default=10.0, help='seconds between progress lines')
+    args = parser.parse_args()
+
+    paths = list_images(args.input)
+    done = completed_paths(args.output)
+    todo = [path for path in paths if path not in done]
+    print(f"📂 {len(paths)} images, {len(done & set(paths))} already screened, {len(todo)} to go", file=sys.stderr)
+    if not todo:
+        return
+
+    # Decode workers start before TensorFlow is imported and never import app.py
+    pool = multiprocessing.get_context('spawn').Pool(args.workers)
+
+    os.environ.setdefault('VERBOSE_LOGGING', '0')
+    os.environ.setdefault('MICRO_BATCHING', '0')
+    os.environ.setdefault('PREDICTION_CACHE', '0')
+    # The models must be loaded when the import returns
+    os.environ['BACKGROUND_LOADING'] = '0'
+    import app
+
+    batches = [todo[i:i + args.batch_size] for i in range(0, len(todo), args.batch_size)]
+    writer = ResultWriter(args.output)
+    pending = deque()
+    screened = failed = 0
+    started = last_report = time.perf_counter()
+
+    try:
+        for index in range(len(batches)):
+            while len(pending) < args.prefetch and index + len(pending) < len(batches):
+                batch_paths = batches[index + len(pending)]
+                pending.append((batch_paths, pool.apply_async(decode_batch, (batch_paths, app.IMAGE_SIZE, app.FAST_DECODE))))
+
+            batch_paths, decoded = pending.popleft()
+            pixels, errors = decoded.get()
+            records = screen_batch(app, batch_paths, pixels, errors)
+            writer.write(records)
+
+            screened += len(records)
+            failed += sum(1 for record in records if 'error' in record)
+            now = time.perf_counter()
+            if now - last_report >= args.progress_interval or screened == len(todo):
+                last_report = now
+                print(f"  {screened}/{len(todo)} screened ({failed} failed), "
+                      f"{screened / (now - started):.1f} images/s", file=sys.stderr)
+    finally:
+        writer.close()
+        pool.terminate()
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        'screened': screened,
+        'failed': failed,
+        'skipped_already_done': len(paths) - len(todo),
+        'elapsed_s': elapsed,
+        'images_per_second': screened / elapsed if elapsed else 0.0,
+        'output': args.output
+    }))
+
+
+if __name__ == '__main__':
+    main()
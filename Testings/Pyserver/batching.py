@@ -0,0 +1,131 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent prediction requests into batched forward passes.
+
+    Request threads call submit() with an image array of shape (k, H, W, 3).
+    A single worker thread collects pending requests until max_batch_size
+    images are queued or max_wait_ms has passed since the first one arrived
+    (a request that would overflow the batch waits for the next one),
+    runs run_batch once on the stacked batch and hands every caller back its
+    own slice of each output. A request larger than max_batch_size is queued
+    as max_batch_size chunks, so no forward pass ever exceeds the limit.
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=5.0, name='micro-batcher'):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._start()
+        # Threads do not survive fork; give a pre-forked worker process its own queue and thread
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self):
+        self._queue = queue.Queue()
+        self._carry = None  # request that did not fit the previous batch
+        self._lock = threading.Lock()
+        self._batches_run = 0
+        self._images_run = 0
+        self._largest_batch = 0
+        self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._worker.start()
+
+    def submit(self, img_array, timeout=None):
+        """
+        Queue an image batch and block until its outputs are ready
+        """
+        if len(img_array) <= self.max_batch_size:
+            future = Future()
+            self._queue.put((img_array, future))
+            return future.result(timeout=timeout)
+
+        futures = []
+        for start in range(0, len(img_array), self.max_batch_size):
+            future = Future()
+            self._queue.put((img_array[start:start + self.max_batch_size], future))
+            futures.append(future)
+
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        parts = [future.result(timeout=None if deadline is None else max(0.0, deadline - time.perf_counter()))
+                 for future in futures]
+        return tuple(np.concatenate(outputs, axis=0) for outputs in zip(*parts))
+
+    def queue_depth(self):
+        return self._queue.qsize() + (self._carry is not None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': self.queue_depth(),
+                'batches_run': self._batches_run,
+                'images_run': self._images_run,
+                'largest_batch': self._largest_batch,
+                'mean_batch_size': self._images_run / self._batches_run if self._batches_run else 0.0
+            }
+
+    def _collect(self):
+        # Block for the first request, then gather more until full or timed out. submit()
+        # keeps every request within max_batch_size; a later one is only added if the
+        # batch stays within it, otherwise it starts the next batch
+        if self._carry is not None:
+            pending, self._carry = [self._carry], None
+        else:
+            pending = [self._queue.get()]
+        count = len(pending[0][0])
+        deadline = time.perf_counter() + self.max_wait
+
+        while count < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if count + len(item[0]) > self.max_batch_size:
+                self._carry = item
+                break
+            pending.append(item)
+            count += len(item[0])
+
+        return pending, count
+
+    def _run(self):
+        while True:
+            pending, count = self._collect()
+            try:
+                if len(pending) == 1:
+                    batch = pending[0][0]
+                else:
+                    batch = np.concatenate([img_array for img_array, _ in pending], axis=0)
+
+                outputs = self.run_batch(batch)
+
+                with self._lock:
+                    self._batches_run += 1
+                    self._images_run += count
+                    self._largest_batch = max(self._largest_batch, count)
+
+                # Hand each caller back its own rows of every output
+                offset = 0
+                for img_array, future in pending:
+                    size = len(img_array)
+                    future.set_result(tuple(output[offset:offset + size] for output in outputs))
+                    offset += size
+
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
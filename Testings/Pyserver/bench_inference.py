@@ -0,0 +1,19 @@
+"""
+Microbenchmark: model.predict() vs the compiled tf.function inference path.
+
+Usage: python bench_inference.py [runs] [batch_size]
+"""
+import os
+import sys
+
+# The models must be loaded when the import returns
+os.environ['BACKGROUND_LOADING'] = '0'
+
+import app
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    infer = app.inference_fn or app.build_inference_function(app.tb_model, app.pneumonia_model, app.fused_model)
+    app.benchmark_inference_paths(app.tb_model, app.pneumonia_model, infer, runs=runs, batch_size=batch_size)
@@ -0,0 +1,191 @@
+"""
+Peak memory of the prediction server under concurrent large uploads.
+
+For each configuration (extra environment variables for app.py, e.g. a different
+MAX_CONCURRENT_DECODES) a server process is started with seeded random weights
+(MOCK_WEIGHTS=1, MODEL_SOURCE=build, cache off). After it reports ready, --uploads
+copies of a synthetic noise PNG of about --image-mb MB (the size of a DICOM-exported
+X-ray) are POSTed to /predict from --concurrency clients. The server's resident set
+size is sampled the whole time. One upload over MAX_REQUEST_BYTES checks that it is
+refused with a 413 without growing the server.
+
+Usage:
+  python bench_memory.py [--uploads 32] [--concurrency 8] [--image-mb 30]
+                         [--configs MAX_CONCURRENT_DECODES=1 MAX_CONCURRENT_DECODES=8 ...]
+
+Linux only (reads /proc/<pid>/status). Prints one JSON document.
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER_ENV = {'MOCK_WEIGHTS': '1', 'MODEL_SOURCE': 'build', 'PREDICTION_CACHE': '0', 'VERBOSE_LOGGING': '0'}
+
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class RssSampler:
+    """
+    Samples a process' resident set size every interval seconds, keeping the peak
+    """
+
+    def __init__(self, pid, interval=0.005):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_mb(self.pid))
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = rss_mb(self.pid)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def noise_png(megabytes):
+    # Noise does not compress, so the PNG is about as large as its raw RGB pixels
+    side = int((megabytes * 1024 * 1024 / 3) ** 0.5)
+    pixels = np.random.default_rng(0).integers(0, 256, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue(), side
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(port):
+    from werkzeug.serving import make_server
+
+    import app
+    app.models_ready.wait()
+    make_server('127.0.0.1', port, app.app, threaded=True).serve_forever()
+
+
+def start_server(config, port, timeout=600):
+    env = dict(os.environ, **SERVER_ENV, **config)
+    process = subprocess.Popen([sys.executable, __file__, '--serve', str(port)], env=env, cwd=HERE,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} for {config}")
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/health/ready', timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise RuntimeError(f"Server not ready after {timeout}s for {config}")
+
+
+def post_image(url, image):
+    started = time.perf_counter()
+    response = requests.post(url, files={'file': ('xray.png', image, 'image/png')}, timeout=600)
+    return response.status_code, (time.perf_counter() - started) * 1000
+
+
+def bench_config(config, image, uploads, concurrency):
+    port = free_port()
+    process = start_server(config, port)
+    url = f'http://127.0.0.1:{port}/predict'
+    try:
+        # One request first so lazily allocated buffers are part of the baseline
+        post_image(url, image)
+        baseline = rss_mb(process.pid)
+
+        with RssSampler(process.pid) as sampler, ThreadPoolExecutor(concurrency) as pool:
+            started = time.perf_counter()
+            results = list(pool.map(lambda _: post_image(url, image), range(uploads)))
+            elapsed = time.perf_counter() - started
+
+        max_request_bytes = int(config.get('MAX_REQUEST_BYTES', 64 * 1024 * 1024))
+        with RssSampler(process.pid) as oversize_sampler:
+            oversize_status, _ = post_image(url, b'\0' * (max_request_bytes + 1))
+
+        statuses = {}
+        for status, _ in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        latencies = [ms for _, ms in results]
+        return {
+            'config': config,
+            'baseline_rss_mb': baseline,
+            'peak_rss_mb': sampler.peak,
+            'peak_growth_mb': sampler.peak - baseline,
+            'uploads_per_second': uploads / elapsed,
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p99_ms': float(np.percentile(latencies, 99)),
+            'statuses': statuses,
+            'oversize_request': {
+                'status': oversize_status,
+                'peak_growth_mb': oversize_sampler.peak - rss_mb(process.pid)
+            }
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--image-mb', type=float, default=30)
+    parser.add_argument('--configs', nargs='*', default=['MAX_CONCURRENT_DECODES=1', 'MAX_CONCURRENT_DECODES=4',
+                                                         'MAX_CONCURRENT_DECODES=64'],
+                        help='one configuration per argument, comma-separated KEY=VALUE pairs')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    image, side = noise_png(args.image_mb)
+    report = {
+        'image': {'bytes': len(image), 'pixels': f'{side}x{side}'},
+        'uploads': args.uploads,
+        'concurrency': args.concurrency,
+        'results': []
+    }
+    for spec in args.configs:
+        config = dict(pair.split('=', 1) for pair in spec.split(',') if pair)
+        print(f"⏱️ {config or 'defaults'}...", file=sys.stderr)
+        report['results'].append(bench_config(config, image, args.uploads, args.concurrency))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
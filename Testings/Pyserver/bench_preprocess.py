@@ -0,0 +1,110 @@
+"""
+Parity check and benchmark for image preprocessing on large synthetic X-rays.
+
+Compares the original preprocess_image_from_bytes pipeline against
+preprocessing.decode_and_resize + image_to_array, both in exact mode
+(must match bit for bit) and in fast mode (draft/reduced decode).
+
+Usage: python bench_preprocess.py [runs]
+"""
+import io
+import json
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import decode_and_resize, image_to_array
+
+IMAGE_SIZE = 224
+RESOLUTIONS = [1024, 2048, 3072, 4096]
+FORMATS = [('PNG', 'L'), ('JPEG', 'L'), ('JPEG', 'RGB')]
+
+
+def legacy_preprocess(image_bytes):
+    # The original pipeline from app.py, without the logging
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img = img.resize((IMAGE_SIZE, IMAGE_SIZE))
+    img_array = np.array(img, dtype=np.float32)
+    img_array = np.expand_dims(img_array, axis=0)
+    return img_array / 255.0
+
+
+def new_preprocess(image_bytes, fast, out):
+    img = decode_and_resize(image_bytes, IMAGE_SIZE, fast=fast)
+    return image_to_array(img, out=out)
+
+
+def synthetic_xray(resolution, fmt, mode, seed=0):
+    # Dark background, two bright lung-field ellipses, rib-like banding and noise
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:resolution, 0:resolution].astype(np.float32) / resolution
+    img = 40 + 60 * np.exp(-((x - 0.5) ** 2 + (y - 0.5) ** 2) * 4)
+    for cx in (0.32, 0.68):
+        img += 90 * (((x - cx) / 0.16) ** 2 + ((y - 0.5) / 0.3) ** 2 < 1)
+    img += 15 * np.sin(y * 60)
+    img += rng.normal(0, 8, img.shape)
+    pixels = np.clip(img, 0, 255).astype(np.uint8)
+
+    image = Image.fromarray(pixels, mode='L')
+    if mode == 'RGB':
+        image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=92) if fmt == 'JPEG' else image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def time_ms(run_once, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_once()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+
+def main(runs=5):
+    out = np.empty((IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.float32)
+    results = []
+    exact_ok = True
+
+    for resolution in RESOLUTIONS:
+        for fmt, mode in FORMATS:
+            image_bytes = synthetic_xray(resolution, fmt, mode)
+            expected = legacy_preprocess(image_bytes)[0]
+
+            exact = new_preprocess(image_bytes, False, out).copy()
+            fast = new_preprocess(image_bytes, True, out).copy()
+            exact_match = bool(np.array_equal(exact, expected))
+            exact_ok = exact_ok and exact_match
+
+            result = {
+                'resolution': resolution,
+                'format': fmt,
+                'mode': mode,
+                'bytes': len(image_bytes),
+                'exact_match': exact_match,
+                'fast_max_abs_diff': float(np.abs(fast - expected).max()),
+                'fast_mean_abs_diff': float(np.abs(fast - expected).mean()),
+                'legacy_ms': time_ms(lambda: legacy_preprocess(image_bytes), runs),
+                'exact_ms': time_ms(lambda: new_preprocess(image_bytes, False, out), runs),
+                'fast_ms': time_ms(lambda: new_preprocess(image_bytes, True, out), runs)
+            }
+            result['fast_speedup'] = result['legacy_ms'] / result['fast_ms']
+            results.append(result)
+
+            print(f"{resolution:>5}px {fmt:<4} {mode:<3} | legacy {result['legacy_ms']:7.1f} ms"
+                  f" | exact {result['exact_ms']:7.1f} ms ({'match' if exact_match else 'MISMATCH'})"
+                  f" | fast {result['fast_ms']:6.1f} ms x{result['fast_speedup']:.1f}"
+                  f" (max diff {result['fast_max_abs_diff']:.4f})", file=sys.stderr)
+
+    print(json.dumps({'image_size': IMAGE_SIZE, 'runs': runs, 'results': results}, indent=2))
+    return exact_ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 5) else 1)
@@ -0,0 +1,249 @@
+"""
+Offline benchmark suite for the inference and symptom pipelines (no network needed).
+
+Runs app.py with seeded random weights (MOCK_WEIGHTS=1, MODEL_SOURCE=build, cache off)
+and measures:
+  preprocess  - decode/resize/normalize of synthetic PNG and JPEG X-rays at several resolutions
+  forward     - both binary models on batches of 1..32 (per-image and per-batch latency)
+  endpoints   - /predict under concurrent clients and /predict_batch, through a real HTTP server
+  symptoms    - predict.py one-shot (one process per record) vs --batch vs --serve vs in-process
+
+Usage:
+  python benchmark_suite.py [--sections preprocess,forward,endpoints,symptoms]
+                            [--runs 5] [--duration 10] [--concurrency 8] [--output results.json]
+
+Prints one JSON document (also written to --output) with environment info, so runs can
+be diffed against each other.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+# Offline, reproducible configuration; must be set before app.py is imported
+os.environ.setdefault('MOCK_WEIGHTS', '1')
+os.environ.setdefault('MODEL_SOURCE', 'build')
+os.environ.setdefault('PREDICTION_CACHE', '0')
+os.environ.setdefault('VERBOSE_LOGGING', '0')
+# The models must be loaded when the import returns
+os.environ['BACKGROUND_LOADING'] = '0'
+
+import numpy as np
+
+from bench_preprocess import synthetic_xray
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PREDICT_SCRIPT = os.path.join(HERE, '..', '..', 'Backend', 'src', 'services', 'predict.py')
+
+SECTIONS = ('preprocess', 'forward', 'endpoints', 'symptoms')
+RESOLUTIONS = [512, 1024, 2048, 3072]
+FORMATS = [('PNG', 'L'), ('JPEG', 'L'), ('JPEG', 'RGB')]
+FORWARD_BATCH_SIZES = [1, 4, 8, 16, 32]
+
+
+def percentiles(timings_ms):
+    return {
+        'p50_ms': float(np.percentile(timings_ms, 50)),
+        'p90_ms': float(np.percentile(timings_ms, 90)),
+        'p99_ms': float(np.percentile(timings_ms, 99)),
+        'mean_ms': float(np.mean(timings_ms))
+    }
+
+
+def measure(run_once, runs, warmup=1):
+    for _ in range(warmup):
+        run_once()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_once()
+        timings.append((time.perf_counter() - start) * 1000)
+    return percentiles(timings)
+
+
+def environment_info():
+    import tensorflow as tf
+    from PIL import Image
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tensorflow': tf.__version__,
+        'numpy': np.__version__,
+        'pillow': Image.__version__
+    }
+
+
+def bench_preprocess(app, runs):
+    out = np.empty((app.IMAGE_SIZE, app.IMAGE_SIZE, 3), dtype=np.float32)
+    results = []
+    for resolution in RESOLUTIONS:
+        for fmt, mode in FORMATS:
+            image_bytes = synthetic_xray(resolution, fmt, mode)
+            result = {'resolution': resolution, 'format': fmt, 'mode': mode, 'bytes': len(image_bytes)}
+            result.update(measure(lambda: app.preprocess_image_from_bytes(image_bytes, out=out), runs))
+            results.append(result)
+            print(f"  preprocess {resolution}px {fmt} {mode}: p50 {result['p50_ms']:.1f} ms", file=sys.stderr)
+    return results
+
+
+def bench_forward(app, runs):
+    results = []
+    for batch_size in FORWARD_BATCH_SIZES:
+        img_array = np.random.default_rng(batch_size).random(
+            (batch_size, app.IMAGE_SIZE, app.IMAGE_SIZE, 3), dtype=np.float32)
+        result = {'batch_size': batch_size}
+        result.update(measure(lambda: app.run_binary_models(app.tb_model, app.pneumonia_model, img_array), runs))
+        result['per_image_ms'] = result['p50_ms'] / batch_size
+        results.append(result)
+        print(f"  forward batch {batch_size}: p50 {result['p50_ms']:.1f} ms "
+              f"({result['per_image_ms']:.1f} ms/image)", file=sys.stderr)
+    return {
+        'path': 'compiled' if app.inference_fn is not None else 'fused' if app.fused_model is not None else 'separate',
+        'results': results
+    }
+
+
+def bench_endpoints(app, concurrency, duration, runs):
+    import requests
+    from werkzeug.serving import make_server
+
+    import load_test
+
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        image_bytes = synthetic_xray(1024, 'JPEG', 'L')
+        results = {}
+
+        single = load_test.run_load(url, image_bytes, 1, duration)
+        results['predict_sequential'] = single
+        print(f"  /predict x1: {single['throughput_rps']:.1f} req/s", file=sys.stderr)
+
+        loaded = load_test.run_load(url, image_bytes, concurrency, duration)
+        results['predict_concurrent'] = loaded
+        print(f"  /predict x{concurrency}: {loaded['throughput_rps']:.1f} req/s, "
+              f"p99 {loaded['p99_ms']:.0f} ms", file=sys.stderr)
+
+        batch_files = [('files', (f'{i}.jpg', synthetic_xray(1024, 'JPEG', 'L', seed=i), 'image/jpeg'))
+                       for i in range(16)]
+        session = requests.Session()
+        batch = measure(lambda: session.post(f"{url}/predict_batch", files=batch_files, timeout=300).raise_for_status(), runs)
+        batch['images'] = len(batch_files)
+        batch['per_image_ms'] = batch['p50_ms'] / len(batch_files)
+        results['predict_batch'] = batch
+        print(f"  /predict_batch of {len(batch_files)}: p50 {batch['p50_ms']:.0f} ms", file=sys.stderr)
+
+        return results
+    finally:
+        server.shutdown()
+
+
+def bench_symptoms(count, runs):
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location('predict', PREDICT_SCRIPT)
+    predict = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(predict)
+
+    records = predict.random_records(count, seed=0)
+    results = {'records': count}
+
+    results['in_process_single'] = measure(lambda: [predict.predict_symptoms(r) for r in records], runs)
+    results['in_process_batch'] = measure(lambda: predict.predict_batch(records), runs)
+
+    # One-shot: one interpreter + model load per record, as the Node fallback path does
+    one_shot_records = records[:min(count, 5)]
+    start = time.perf_counter()
+    for record in one_shot_records:
+        subprocess.run([sys.executable, PREDICT_SCRIPT, json.dumps(record)], check=True, capture_output=True)
+    results['one_shot_per_record_ms'] = (time.perf_counter() - start) * 1000 / len(one_shot_records)
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, PREDICT_SCRIPT, '--batch', '-'], input=json.dumps(records),
+                   text=True, check=True, capture_output=True)
+    results['batch_process_total_ms'] = (time.perf_counter() - start) * 1000
+
+    # Long-lived worker: per-request round trip once the model is loaded
+    worker = subprocess.Popen([sys.executable, PREDICT_SCRIPT, '--serve'], stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, text=True, bufsize=1)
+    try:
+        worker.stdout.readline()
+        timings = []
+        for i, record in enumerate(records):
+            start = time.perf_counter()
+            worker.stdin.write(json.dumps({'id': i, 'input': record}) + '\n')
+            worker.stdout.readline()
+            timings.append((time.perf_counter() - start) * 1000)
+        results['serve_per_record'] = percentiles(timings)
+    finally:
+        worker.stdin.close()
+        worker.wait()
+
+    print(f"  symptoms: one-shot {results['one_shot_per_record_ms']:.0f} ms/record, "
+          f"serve p50 {results['serve_per_record']['p50_ms']:.2f} ms, "
+          f"batch of {count} {results['in_process_batch']['p50_ms']:.1f} ms in-process", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sections', default=','.join(SECTIONS))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per endpoint load run')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--symptom-records', type=int, default=200)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    sections = [s for s in args.sections.split(',') if s]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections {sorted(unknown)}, expected {SECTIONS}")
+
+    report = {'environment': environment_info(), 'config': vars(args), 'results': {}}
+
+    if set(sections) & {'preprocess', 'forward', 'endpoints'}:
+        started = time.perf_counter()
+        import app
+        report['startup_s'] = time.perf_counter() - started
+        report['config'].update({
+            'fused_inference': app.fused_model is not None,
+            'compiled_inference': app.inference_fn is not None,
+            'micro_batching': app.prediction_batcher is not None,
+            'quantized_mode': app.QUANTIZED_MODE or None
+        })
+
+    if 'preprocess' in sections:
+        report['results']['preprocess'] = bench_preprocess(app, args.runs)
+    if 'forward' in sections:
+        report['results']['forward'] = bench_forward(app, args.runs)
+    if 'endpoints' in sections:
+        report['results']['endpoints'] = bench_endpoints(app, args.concurrency, args.duration, args.runs)
+    if 'symptoms' in sections:
+        report['results']['symptoms'] = bench_symptoms(args.symptom_records, args.runs)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
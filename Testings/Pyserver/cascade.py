@@ -0,0 +1,47 @@
+import threading
+
+import numpy as np
+
+REJECTED_NOT_XRAY = 'rejected_not_xray'
+SCREENED_NEGATIVE = 'screened_negative'
+ESCALATED = 'escalated'
+DECISIONS = (REJECTED_NOT_XRAY, SCREENED_NEGATIVE, ESCALATED)
+
+
+class TriageCascade:
+    """
+    Confidence bands and exit statistics of the early-exit triage cascade.
+
+    Stage 1a rejects images whose X-ray validation score is below reject_below.
+    Stage 1b exits images whose cheap screen gives both diseases a probability
+    below negative_below as confident negatives. Everything else, uncertain or
+    positive, is escalated to the full-size model pair.
+    """
+
+    def __init__(self, reject_below=0.2, negative_below=0.05):
+        self.reject_below = float(reject_below)
+        self.negative_below = float(negative_below)
+        self._counts = dict.fromkeys(DECISIONS, 0)
+        self._lock = threading.Lock()
+
+    def rejects(self, xray_probs):
+        return np.asarray(xray_probs) < self.reject_below
+
+    def negatives(self, tb_probs, pneumonia_probs):
+        return np.maximum(tb_probs, pneumonia_probs) < self.negative_below
+
+    def record(self, decisions):
+        with self._lock:
+            for decision in decisions:
+                self._counts[decision] += 1
+
+    def stats(self):
+        with self._lock:
+            total = sum(self._counts.values())
+            return {
+                'reject_below': self.reject_below,
+                'negative_below': self.negative_below,
+                'images': total,
+                'exits': dict(self._counts),
+                'exit_rates': {d: (count / total if total else 0.0) for d, count in self._counts.items()}
+            }
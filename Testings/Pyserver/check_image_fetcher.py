@@ -0,0 +1,116 @@
+"""
+Exercise ImageFetcher against a local stub HTTP server (no network needed).
+
+Checks keep-alive connection reuse, the size cap (both a declared oversized
+Content-Length and an oversized chunked body), error handling, bounded
+concurrency and the sync/async batch variants.
+
+Usage: python check_image_fetcher.py
+"""
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from image_fetcher import ImageFetcher, ImageFetchError
+
+SMALL_BODY = b'\x89PNG' + b'x' * 4096
+LIMIT = 64 * 1024
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+    active = 0
+    peak_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        StubHandler.connections.add(self.client_address)
+        with StubHandler.lock:
+            StubHandler.active += 1
+            StubHandler.peak_active = max(StubHandler.peak_active, StubHandler.active)
+        try:
+            if self.path.startswith('/slow'):
+                time.sleep(0.2)
+                self._send(SMALL_BODY)
+            elif self.path == '/big-declared':
+                self._send(b'x' * (LIMIT * 2))
+            elif self.path == '/big-chunked':
+                self.send_response(200)
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                chunk = b'x' * 16384
+                for _ in range(LIMIT // len(chunk) + 2):
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+            elif self.path == '/missing':
+                self._send(b'not found', status=404)
+            else:
+                self._send(SMALL_BODY)
+        finally:
+            with StubHandler.lock:
+                StubHandler.active -= 1
+
+    def _send(self, body, status=200):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Aborted oversized downloads reset their connection; that is expected
+        pass
+
+
+def expect_error(fetcher, url):
+    try:
+        fetcher.fetch(url)
+    except ImageFetchError:
+        return True
+    return False
+
+
+def main():
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    fetcher = ImageFetcher(max_bytes=LIMIT, timeout=5, pool_size=4, max_concurrency=3)
+    checks = {}
+
+    StubHandler.connections.clear()
+    checks['fetch_returns_body'] = all(fetcher.fetch(f"{base}/image.png") == SMALL_BODY for _ in range(10))
+    checks['keep_alive_reuses_connection'] = len(StubHandler.connections) == 1
+
+    checks['rejects_declared_oversize'] = expect_error(fetcher, f"{base}/big-declared")
+    checks['rejects_streamed_oversize'] = expect_error(fetcher, f"{base}/big-chunked")
+    checks['rejects_http_errors'] = expect_error(fetcher, f"{base}/missing")
+
+    StubHandler.peak_active = 0
+    urls = [f"{base}/slow/{i}" for i in range(9)] + [f"{base}/missing"]
+    results = fetcher.fetch_many(urls)
+    checks['fetch_many_in_order'] = all(r == SMALL_BODY for r in results[:-1]) and isinstance(results[-1], ImageFetchError)
+    checks['concurrency_bounded'] = 1 < StubHandler.peak_active <= fetcher.max_concurrency
+
+    results = asyncio.run(fetcher.fetch_many_async([f"{base}/slow/{i}" for i in range(6)]))
+    checks['fetch_many_async'] = all(r == SMALL_BODY for r in results)
+
+    fetcher.close()
+    server.shutdown()
+
+    for name, passed in checks.items():
+        print(f"{'✓' if passed else '❌'} {name}")
+    return all(checks.values())
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,105 @@
+"""
+Check the TensorFlow.js layers-model loader without the tensorflowjs package.
+
+Writes a small nested Sequential(Functional) model in the tfjs layout (model.json
+plus sharded float32 and uint8-quantized weights), loads it back through
+tfjs_models.load_layers_model and compares outputs, then reports whether the
+Backend's trained_model directories have all their weight shards.
+
+Usage: python check_tfjs_models.py
+"""
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+import tfjs_models
+
+TRAINED_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Backend', 'src', 'trained_model')
+SHARD_BYTES = 4096
+
+
+def build_model():
+    inputs = tf.keras.Input((32, 32, 3))
+    x = tf.keras.layers.Conv2D(8, 3, activation='relu', name='block1_conv1')(inputs)
+    x = tf.keras.layers.MaxPooling2D(name='block1_pool')(x)
+    base = tf.keras.Model(inputs, x, name='base')
+    return tf.keras.Sequential([
+        base,
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(4, activation='relu', name='dense'),
+        tf.keras.layers.Dense(1, activation='sigmoid', name='dense_1')
+    ])
+
+
+def write_tfjs(model, model_dir, quantize=()):
+    # Reversed order: the loader must match by name, as the converter's order differs from Keras'
+    specs, data = [], b''
+    for layer in reversed(list(tfjs_models.flatten_layers(model))):
+        for variable in layer.weights:
+            name = f"{layer.name}/{variable.name.split('/')[-1].split(':')[0]}"
+            values = variable.numpy()
+            spec = {'name': name, 'shape': list(values.shape), 'dtype': 'float32'}
+            if name in quantize:
+                low, high = float(values.min()), float(values.max())
+                scale = (high - low) / 255 or 1.0
+                spec['quantization'] = {'dtype': 'uint8', 'min': low, 'scale': scale}
+                data += np.round((values - low) / scale).astype(np.uint8).tobytes()
+            else:
+                data += values.astype(np.float32).tobytes()
+            specs.append(spec)
+
+    paths = []
+    for i in range(0, len(data), SHARD_BYTES):
+        paths.append(f"group1-shard{len(paths) + 1}of{(len(data) + SHARD_BYTES - 1) // SHARD_BYTES}.bin")
+        with open(os.path.join(model_dir, paths[-1]), 'wb') as f:
+            f.write(data[i:i + SHARD_BYTES])
+
+    with open(os.path.join(model_dir, 'model.json'), 'w') as f:
+        json.dump({
+            'format': 'layers-model',
+            'modelTopology': {'model_config': json.loads(model.to_json())},
+            'weightsManifest': [{'paths': paths, 'weights': specs}]
+        }, f)
+
+
+def main():
+    model = build_model()
+    images = np.random.default_rng(0).random((4, 32, 32, 3), dtype=np.float32)
+    expected = model.predict(images, verbose=0)
+    checks = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_tfjs(model, tmp)
+        loaded = tfjs_models.load_layers_model(tmp)
+        checks['float32_weights_match'] = np.allclose(loaded.predict(images, verbose=0), expected, atol=1e-6)
+
+        write_tfjs(model, tmp, quantize={'dense/kernel'})
+        loaded = tfjs_models.load_layers_model(tmp)
+        checks['uint8_quantized_weights_close'] = np.allclose(loaded.predict(images, verbose=0), expected, atol=1e-2)
+
+        os.remove(os.path.join(tmp, tfjs_models.read_model_json(tmp)['weightsManifest'][0]['paths'][0]))
+        try:
+            tfjs_models.load_layers_model(tmp)
+            checks['missing_shard_detected'] = False
+        except FileNotFoundError:
+            checks['missing_shard_detected'] = True
+
+    for name, passed in checks.items():
+        print(f"{'✓' if passed else '❌'} {name}")
+
+    for name in sorted(os.listdir(TRAINED_MODEL_DIR)):
+        model_dir = os.path.join(TRAINED_MODEL_DIR, name)
+        if os.path.exists(os.path.join(model_dir, 'model.json')):
+            missing = tfjs_models.missing_shards(model_dir)
+            print(f"{'⚠️' if missing else '✓'} trained_model/{name}: "
+                  f"{f'{len(missing)} weight shard(s) missing' if missing else 'all weight shards present'}")
+
+    return all(checks.values())
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
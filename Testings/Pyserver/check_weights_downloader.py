@@ -0,0 +1,167 @@
+"""
+Exercise WeightsDownloader against a local stub HTTP server (no network needed).
+
+Checks a plain download with checksum record, skipping a verified cache without
+any request, re-downloading a corrupted cache, resuming a dropped download with
+a Range request, following a Drive-style virus-scan form, rejecting a checksum
+mismatch and downloading two files in parallel.
+
+Usage: python check_weights_downloader.py
+"""
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from weights_downloader import WeightsDownloader, WeightsDownloadError, partial_path
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 123)
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+DROP_AFTER = 1024 * 1024
+
+INTERSTITIAL = b'''<html><body>Google Drive can't scan this file for viruses.
+<form id="download-form" action="/confirmed" method="get">
+<input type="hidden" name="id" value="abc"><input type="hidden" name="confirm" value="t">
+<input type="hidden" name="uuid" value="1234"></form></body></html>'''
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests_seen = []
+    range_requests = []
+    active = 0
+    peak_active = 0
+    dropped = set()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        StubHandler.requests_seen.append(self.path)
+        if self.headers.get('Range'):
+            StubHandler.range_requests.append(self.headers['Range'])
+        with StubHandler.lock:
+            StubHandler.active += 1
+            StubHandler.peak_active = max(StubHandler.peak_active, StubHandler.active)
+        try:
+            if self.path == '/drive':
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(INTERSTITIAL)))
+                self.end_headers()
+                self.wfile.write(INTERSTITIAL)
+            elif self.path.startswith('/confirmed?') and 'confirm=t' in self.path and 'uuid=1234' in self.path:
+                self._send_payload()
+            elif self.path.startswith('/slow'):
+                time.sleep(0.3)
+                self._send_payload()
+            elif self.path == '/flaky' and '/flaky' not in StubHandler.dropped and not self.headers.get('Range'):
+                # Announce the full length, send part of it and drop the connection
+                StubHandler.dropped.add('/flaky')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(PAYLOAD)))
+                self.end_headers()
+                self.wfile.write(PAYLOAD[:DROP_AFTER])
+                self.wfile.flush()
+                self.close_connection = True
+            else:
+                self._send_payload()
+        finally:
+            with StubHandler.lock:
+                StubHandler.active -= 1
+
+    def _send_payload(self):
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header:
+            start = int(range_header.split('=')[1].split('-')[0])
+            if start >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(PAYLOAD)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(PAYLOAD) - start))
+        self.end_headers()
+        self.wfile.write(PAYLOAD[start:])
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The flaky endpoint drops its connection on purpose
+        pass
+
+
+def file_matches(path):
+    with open(path, 'rb') as f:
+        return f.read() == PAYLOAD
+
+
+def main():
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    downloader = WeightsDownloader(timeout=5, max_retries=2, progress_interval=60)
+    checks = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'weights.h5')
+
+        downloader.download(f"{base}/weights.h5", path, PAYLOAD_SHA256)
+        checks['downloads_and_verifies'] = file_matches(path) and not os.path.exists(partial_path(path))
+
+        StubHandler.requests_seen.clear()
+        downloader.download(f"{base}/weights.h5", path)
+        checks['verified_cache_skips_request'] = StubHandler.requests_seen == []
+
+        with open(path, 'r+b') as f:
+            f.write(b'corrupt')
+        StubHandler.requests_seen.clear()
+        downloader.download(f"{base}/weights.h5", path)
+        checks['corrupted_cache_redownloaded'] = file_matches(path) and len(StubHandler.requests_seen) > 0
+
+        flaky_path = os.path.join(tmp, 'flaky.h5')
+        StubHandler.range_requests.clear()
+        downloader.download(f"{base}/flaky", flaky_path, PAYLOAD_SHA256)
+        checks['resumes_with_range'] = file_matches(flaky_path) and any(
+            r.startswith('bytes=') and r != 'bytes=0-' for r in StubHandler.range_requests)
+
+        drive_path = os.path.join(tmp, 'drive.h5')
+        downloader.download(f"{base}/drive", drive_path, PAYLOAD_SHA256)
+        checks['follows_drive_interstitial'] = file_matches(drive_path)
+
+        bad_path = os.path.join(tmp, 'bad.h5')
+        try:
+            downloader.download(f"{base}/weights.h5", bad_path, '0' * 64)
+            checks['rejects_checksum_mismatch'] = False
+        except WeightsDownloadError:
+            checks['rejects_checksum_mismatch'] = not os.path.exists(bad_path)
+
+        StubHandler.peak_active = 0
+        jobs = [(f"{base}/slow/{i}", os.path.join(tmp, f'parallel{i}.h5'), PAYLOAD_SHA256) for i in range(2)]
+        results = downloader.download_many(jobs)
+        checks['downloads_in_parallel'] = (all(result == job[1] for result, job in zip(results, jobs))
+                                           and StubHandler.peak_active == 2)
+
+    server.shutdown()
+
+    for name, passed in checks.items():
+        print(f"{'✓' if passed else '❌'} {name}")
+    return all(checks.values())
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
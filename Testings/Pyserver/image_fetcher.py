@@ -0,0 +1,92 @@
+import asyncio
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+class ImageFetcher:
+    """
+    Pooled, size-capped image downloader.
+
+    One requests.Session with a keep-alive connection pool is shared by every
+    request, so repeated fetches from the same host (Cloudinary) reuse the
+    TCP+TLS connection. Bodies are streamed and the download is aborted as soon
+    as Content-Length or the bytes read exceed max_bytes. At most
+    max_concurrency downloads run at once; extra callers wait for a slot.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, timeout=15, pool_size=16, max_concurrency=8,
+                 chunk_size=64 * 1024, user_agent='ChestGuard-Python-Server/1.0'):
+        self.max_bytes = int(max_bytes)
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='image-fetch')
+
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': user_agent})
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url):
+        """
+        Download url and return its bytes; raises ImageFetchError on failure or oversize
+        """
+        with self._slots:
+            try:
+                with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                    response.raise_for_status()
+
+                    declared = response.headers.get('Content-Length')
+                    if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+                        raise ImageFetchError(f"Image is {declared} bytes, limit is {self.max_bytes}")
+
+                    buffer = io.BytesIO()
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        buffer.write(chunk)
+                        if buffer.tell() > self.max_bytes:
+                            raise ImageFetchError(f"Image exceeds the {self.max_bytes} byte limit")
+
+            except requests.RequestException as e:
+                raise ImageFetchError(str(e)) from e
+
+        if not buffer.tell():
+            raise ImageFetchError("Downloaded image is empty")
+        # getvalue() hands over BytesIO's own buffer, so the body is never held twice
+        return buffer.getvalue()
+
+    def _fetch_or_error(self, url):
+        try:
+            return self.fetch(url)
+        except Exception as e:
+            return e if isinstance(e, ImageFetchError) else ImageFetchError(str(e))
+
+    def fetch_many(self, urls):
+        """
+        Fetch several URLs in parallel; returns bytes or an ImageFetchError per URL, in order
+        """
+        return list(self._executor.map(self._fetch_or_error, urls))
+
+    async def fetch_async(self, url):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.fetch, url)
+
+    async def fetch_many_async(self, urls):
+        """
+        Async variant of fetch_many for callers running an event loop
+        """
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(self._executor, self._fetch_or_error, url) for url in urls))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
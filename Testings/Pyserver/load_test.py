@@ -0,0 +1,166 @@
+"""
+Load test for the prediction server: concurrent /predict uploads of a synthetic X-ray.
+
+Usage:
+  python load_test.py [--url http://127.0.0.1:5000] [--concurrency 16] [--duration 30]
+      Load an already running server and print throughput and latency percentiles.
+
+  python load_test.py --scale 1,2,4,8 [--port 5055] [--concurrency 32] [--duration 30]
+      Start serve.py with each WORKERS value in turn, wait for /health, load it,
+      stop it, and print a throughput-vs-workers table.
+
+Add --json to print the results as JSON.
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+from PIL import Image
+
+
+def synthetic_xray_png(size=512, seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (size, size), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, mode='L').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def run_load(url, image_bytes, concurrency, duration):
+    """
+    Keep `concurrency` clients posting to /predict for `duration` seconds. Every request
+    carries a unique trailer after the PNG's end chunk (ignored by decoders), so the
+    server's prediction cache never answers from a previous upload.
+    """
+    latencies = []
+    errors = 0
+    sent = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        nonlocal errors, sent
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            with lock:
+                sent += 1
+                upload = image_bytes + sent.to_bytes(8, 'big')
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{url}/predict", files={'file': ('xray.png', upload, 'image/png')}, timeout=120)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    timings_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'wall_s': wall,
+        'throughput_rps': len(latencies) / wall,
+        'p50_ms': float(np.percentile(timings_ms, 50)),
+        'p95_ms': float(np.percentile(timings_ms, 95)),
+        'p99_ms': float(np.percentile(timings_ms, 99))
+    }
+
+
+def wait_for_health(url, process, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"serve.py exited with code {process.returncode} during startup")
+        try:
+            if requests.get(f"{url}/health", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"server at {url} not healthy after {timeout}s")
+
+
+def run_scaling(worker_counts, port, image_bytes, concurrency, duration, startup_timeout):
+    url = f"http://127.0.0.1:{port}"
+    results = []
+    for workers in worker_counts:
+        env = dict(os.environ, WORKERS=str(workers), PORT=str(port), HOST='127.0.0.1', PREDICTION_CACHE='0')
+        # Let serve.py split the cores per worker unless the caller pinned thread counts
+        process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')],
+                                   env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_health(url, process, startup_timeout)
+            # Warm every worker before measuring
+            run_load(url, image_bytes, concurrency, min(5, duration))
+            result = run_load(url, image_bytes, concurrency, duration)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+        result['workers'] = workers
+        results.append(result)
+        print(f"✓ {workers} workers: {result['throughput_rps']:.1f} req/s, p50 {result['p50_ms']:.0f}ms", file=sys.stderr)
+
+    base = results[0]['throughput_rps'] or 1.0
+    for result in results:
+        result['speedup'] = result['throughput_rps'] / base
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--scale', help='comma-separated WORKERS values to launch serve.py with')
+    parser.add_argument('--port', type=int, default=5055, help='port for serve.py in --scale mode')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--image-size', type=int, default=512)
+    parser.add_argument('--startup-timeout', type=float, default=600)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    image_bytes = synthetic_xray_png(args.image_size)
+
+    if args.scale:
+        worker_counts = [int(w) for w in args.scale.split(',')]
+        results = run_scaling(worker_counts, args.port, image_bytes, args.concurrency, args.duration, args.startup_timeout)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print(f"{'workers':>8} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            for r in results:
+                print(f"{r['workers']:>8} {r['throughput_rps']:>9.1f} {r['speedup']:>7.2f}x "
+                      f"{r['p50_ms']:>8.0f} {r['p99_ms']:>8.0f} {r['errors']:>7}")
+        return
+
+    result = run_load(args.url, image_bytes, args.concurrency, args.duration)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['requests']} requests in {result['wall_s']:.1f}s: {result['throughput_rps']:.1f} req/s, "
+              f"p50 {result['p50_ms']:.0f}ms, p95 {result['p95_ms']:.0f}ms, p99 {result['p99_ms']:.0f}ms, "
+              f"{result['errors']} errors")
+
+
+if __name__ == '__main__':
+    main()
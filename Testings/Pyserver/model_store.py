@@ -0,0 +1,111 @@
+"""
+Local, checksum-verified store of inference-only model artifacts.
+
+Each model is saved as a single full-model file (architecture + weights, no
+optimizer) next to a manifest.json recording its SHA-256 and size. Loading
+from the store verifies the checksum and deserializes with compile=False, so
+startup needs neither the ImageNet download, the architecture build, nor an
+optimizer.
+
+Usage: python model_store.py --export   (loads the models through app.py and exports them)
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+
+import tensorflow as tf
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(store_dir, manifest):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def has_model(store_dir, name):
+    return name in read_manifest(store_dir)
+
+
+def export_model(model, store_dir, name, extension='.h5'):
+    """
+    Save an inference-only copy of model into the store and record its checksum
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    filename = f"{name}{extension}"
+    path = os.path.join(store_dir, filename)
+    tmp_path = os.path.join(store_dir, f".{name}.tmp{extension}")
+
+    model.save(tmp_path, include_optimizer=False)
+    os.replace(tmp_path, path)
+
+    manifest = read_manifest(store_dir)
+    manifest[name] = {
+        'file': filename,
+        'sha256': sha256_file(path),
+        'bytes': os.path.getsize(path),
+        'tensorflow': tf.__version__,
+        'exported_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+    write_manifest(store_dir, manifest)
+
+    print(f"✓ Exported {name} to {path} ({manifest[name]['bytes']} bytes, sha256 {manifest[name]['sha256'][:12]})")
+    return path
+
+
+def load_model(store_dir, name):
+    """
+    Load a model from the store after verifying its checksum.
+    Returns (model, timings) where timings has 'verify_s' and 'deserialize_s'.
+    Raises if the model is missing from the manifest or the checksum does not match.
+    """
+    entry = read_manifest(store_dir).get(name)
+    if entry is None:
+        raise FileNotFoundError(f"{name} is not in the model store at {store_dir}")
+
+    path = os.path.join(store_dir, entry['file'])
+
+    start = time.perf_counter()
+    actual = sha256_file(path)
+    verify_s = time.perf_counter() - start
+    if actual != entry['sha256']:
+        raise ValueError(f"Checksum mismatch for {path}: expected {entry['sha256']}, got {actual}")
+
+    start = time.perf_counter()
+    model = tf.keras.models.load_model(path, compile=False)
+    deserialize_s = time.perf_counter() - start
+
+    return model, {'verify_s': verify_s, 'deserialize_s': deserialize_s}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--export':
+        # The models must be loaded when the import returns
+        os.environ['BACKGROUND_LOADING'] = '0'
+        import app
+
+        for model_name, model in (('TB_Model', app.tb_model), ('Pneumonia_Model', app.pneumonia_model)):
+            export_model(model, app.MODEL_STORE_DIR, model_name)
+    else:
+        print(__doc__)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def hash_image_bytes(image_bytes):
+    """
+    Content address of an image: SHA-256 of its raw bytes
+    """
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def hash_image_file(file_obj, chunk_size=1024 * 1024):
+    """
+    hash_image_bytes of a binary file object's content, read in chunks from the start
+    """
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of raw (tb_prob, pneumonia_prob) pairs keyed by image hash, with
+    the triage cascade's decision for the image when it ran.
+
+    A second, equally bounded LRU maps image URLs to hashes so a repeated URL
+    can be answered without downloading it again. Entries are namespaced by
+    model_version so results from other weights are never returned. When
+    persist_path is set, entries are written through to a SQLite file and
+    read back on a memory miss, so the cache survives restarts. The file is
+    bounded like memory: evicted and expired rows are deleted, and the table is
+    trimmed to the newest max_entries rows on open and every max_entries / 10 writes.
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=86400, persist_path=None, model_version=''):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.model_version = model_version
+        self._entries = OrderedDict()
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._url_hits = 0
+        self._disk_hits = 0
+
+        self.persist_path = persist_path
+        self._db = None
+        self._inherited_db = None
+        self._writes_since_prune = 0
+        if persist_path:
+            self._db = self._connect()
+
+    def _connect(self):
+        db = sqlite3.connect(self.persist_path, check_same_thread=False)
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            'key TEXT PRIMARY KEY, tb_prob REAL, pneumonia_prob REAL, created REAL, triage TEXT)'
+        )
+        # Files written before triage was stored get the column added
+        if 'triage' not in {row[1] for row in db.execute('PRAGMA table_info(predictions)')}:
+            db.execute('ALTER TABLE predictions ADD COLUMN triage TEXT')
+        db.execute('CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)')
+        self._prune(db)
+        db.commit()
+        return db
+
+    def _prune(self, db):
+        # Drop expired rows, then everything but the newest max_entries; the caller commits
+        if self.ttl_seconds > 0:
+            db.execute('DELETE FROM predictions WHERE created < ?', (time.time() - self.ttl_seconds,))
+        db.execute(
+            'DELETE FROM predictions WHERE key IN '
+            '(SELECT key FROM predictions ORDER BY created DESC LIMIT -1 OFFSET ?)', (self.max_entries,)
+        )
+        self._writes_since_prune = 0
+
+    def reopen(self):
+        """
+        Give a process forked after this cache was created its own lock and SQLite
+        connection. The inherited connection must not be used or closed in the child,
+        so it is only kept referenced.
+        """
+        self._lock = threading.Lock()
+        if self.persist_path:
+            self._inherited_db = self._db
+            self._db = self._connect()
+
+    def _key(self, image_hash):
+        return f"{self.model_version}:{image_hash}"
+
+    def _expired(self, created):
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def _remember(self, store, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            evicted, _ = store.popitem(last=False)
+            # Evicted predictions leave the file too, so it stays as bounded as memory
+            if store is self._entries and self._db is not None:
+                self._db.execute('DELETE FROM predictions WHERE key = ?', (evicted,))
+
+    def _lookup(self, image_hash):
+        # Caller holds the lock
+        key = self._key(image_hash)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not self._expired(entry[2]):
+                self._entries.move_to_end(key)
+                return entry[0], entry[1], entry[3]
+            del self._entries[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                'SELECT tb_prob, pneumonia_prob, created, triage FROM predictions WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[2]):
+                self._db.execute('DELETE FROM predictions WHERE key = ?', (key,))
+                self._db.commit()
+            elif row is not None:
+                entry = (row[0], row[1], row[2], json.loads(row[3]) if row[3] else None)
+                self._remember(self._entries, key, entry)
+                self._db.commit()  # rows evicted to make room
+                self._disk_hits += 1
+                return entry[0], entry[1], entry[3]
+
+        return None
+
+    def get(self, image_hash):
+        """
+        Return (tb_prob, pneumonia_prob, triage) for an image hash, or None
+        """
+        with self._lock:
+            probs = self._lookup(image_hash)
+            if probs is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return probs
+
+    def get_by_url(self, image_url):
+        """
+        Return (image_hash, probs) for a URL seen before, or (None, None)
+        """
+        with self._lock:
+            image_hash = self._urls.get(image_url)
+            if image_hash is None:
+                return None, None
+            probs = self._lookup(image_hash)
+            if probs is None:
+                return None, None
+            self._urls.move_to_end(image_url)
+            self._hits += 1
+            self._url_hits += 1
+            return image_hash, probs
+
+    def put(self, image_hash, tb_prob, pneumonia_prob, image_url=None, triage=None):
+        created = time.time()
+        key = self._key(image_hash)
+        with self._lock:
+            self._remember(self._entries, key, (float(tb_prob), float(pneumonia_prob), created, triage))
+            if image_url:
+                self._remember(self._urls, image_url, image_hash)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO predictions (key, tb_prob, pneumonia_prob, created, triage) VALUES (?, ?, ?, ?, ?)',
+                    (key, float(tb_prob), float(pneumonia_prob), created, json.dumps(triage) if triage else None)
+                )
+                # Rows of other processes, earlier runs and older model versions are only trimmed here
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= max(1, self.max_entries // 10):
+                    self._prune(self._db)
+                self._db.commit()
+
+    def remember_url(self, image_url, image_hash):
+        with self._lock:
+            self._remember(self._urls, image_url, image_hash)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'urls': len(self._urls),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'persistent': self._db is not None,
+                'hits': self._hits,
+                'misses': self._misses,
+                'url_hits': self._url_hits,
+                'disk_hits': self._disk_hits,
+                'hit_rate': self._hits / lookups if lookups else 0.0
+            }
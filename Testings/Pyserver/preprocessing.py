@@ -0,0 +1,89 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# Let the JPEG decoder downscale by DCT scaling to no less than this multiple of
+# the target size before the final resample (keeps quality, skips most of the decode)
+DRAFT_SCALE = 2
+
+# Pillow reduces by an integer box filter first when the image is at least this many
+# times bigger than the target; 3.0 is visually indistinguishable from a full resample
+REDUCING_GAP = 3.0
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def decode_image(image, size, fast=True, max_pixels=None):
+    """
+    Decode image bytes (or a seekable binary file object, read in place without
+    buffering it whole) into a loaded PIL image. With fast=True large JPEGs are
+    decoded in draft mode, at no less than DRAFT_SCALE times the target size.
+    Raises ImageTooLarge, before decoding, when the decode would exceed max_pixels.
+    """
+    # BytesIO shares the bytes object's buffer, it does not copy it
+    img = Image.open(image if hasattr(image, 'read') else io.BytesIO(image))
+
+    if fast and img.format == 'JPEG' and img.mode in ('L', 'RGB'):
+        img.draft(img.mode, (size * DRAFT_SCALE, size * DRAFT_SCALE))
+
+    if max_pixels and img.width * img.height > max_pixels:
+        raise ImageTooLarge(f"Image is {img.width}x{img.height} pixels, limit is {max_pixels} pixels")
+
+    img.load()
+    return img
+
+
+def resize_image(img, size, fast=True):
+    """
+    Resize a decoded image to (size, size) RGB. With fast=True other large images
+    are box-reduced before the resample and grayscale images are resized in L mode
+    (one channel instead of three) before expanding to RGB.
+    """
+    # Grayscale can be resized before expanding to RGB; everything else converts first
+    if img.mode not in ('L', 'RGB') or not fast:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+    if fast:
+        img = img.resize((size, size), reducing_gap=REDUCING_GAP)
+    else:
+        img = img.resize((size, size))
+
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    return img
+
+
+def decode_and_resize(image_bytes, size, fast=True):
+    """
+    Decode image bytes and resize to (size, size) RGB.
+
+    With fast=False this is exactly the original path: decode at full resolution,
+    convert to RGB, resize.
+    """
+    return resize_image(decode_image(image_bytes, size, fast), size, fast)
+
+
+def decode_pyramid(image, sizes, fast=True, max_pixels=None):
+    """
+    Decode an image once and resize to every size in sizes: {size: (size, size) RGB image}.
+    The draft decode is sized for the largest level, so every level keeps full quality.
+    """
+    img = decode_image(image, max(sizes), fast, max_pixels)
+    return {size: resize_image(img, size, fast) for size in sorted(set(sizes), reverse=True)}
+
+
+def image_to_array(img, out=None):
+    """
+    Scale an RGB image to float32 [0, 1], writing into out (H, W, 3) when given
+    """
+    pixels = np.asarray(img)
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float32)
+    # Same float32 division as np.array(img, dtype=np.float32) / 255.0, without the temporaries
+    np.divide(pixels, np.float32(255.0), out=out, dtype=np.float32)
+    return out
@@ -0,0 +1,202 @@
+"""
+Post-training quantization of the binary VGG16 models via TFLite.
+
+Modes:
+  dynamic  - int8 weights, float activations (no calibration needed)
+  float16  - float16 weights
+  int8     - int8 weights and activations, calibrated on representative X-rays
+
+Usage:
+  python quantization.py --mode int8 --calibration-dir DIR --eval-dir DIR [--limit N]
+
+Converts both models (loaded through app.py), saves the .tflite artifacts to the
+model store and prints a JSON report of probability drift against float32,
+decision agreement, latency and RSS.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from preprocessing import decode_and_resize, image_to_array
+
+QUANTIZATION_MODES = ('dynamic', 'float16', 'int8')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def current_rss_mb():
+    """
+    Resident set size of this process in MB (Linux), or None where unavailable
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def load_image_dir(directory, image_size, limit=None):
+    """
+    Preprocess every image in a directory into one (N, size, size, 3) float32 array
+    """
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(IMAGE_EXTENSIONS))
+    if limit:
+        names = names[:limit]
+
+    images = np.empty((len(names), image_size, image_size, 3), dtype=np.float32)
+    for i, name in enumerate(names):
+        with open(os.path.join(directory, name), 'rb') as f:
+            image_to_array(decode_and_resize(f.read(), image_size, fast=False), out=images[i])
+    return images
+
+
+def convert_model(model, mode, representative_images=None):
+    """
+    Convert a Keras model to a quantized TFLite flatbuffer (float32 input and output)
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        if representative_images is None or len(representative_images) == 0:
+            raise ValueError("int8 quantization needs representative images for calibration")
+
+        def representative_dataset():
+            for image in representative_images:
+                yield [image[np.newaxis]]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
+
+
+class TFLiteBinaryModel:
+    """
+    Serves a quantized binary model with the same predict() interface as the Keras model,
+    returning an (N, 1) array of probabilities. Interpreter calls are serialized with a lock.
+
+    Pass model_path instead of model_content to have TFLite memory-map the file: the
+    weights then live in the page cache and are shared by every process serving it.
+    """
+
+    def __init__(self, model_content=None, name='quantized_model', num_threads=None, model_path=None):
+        self.name = name
+        if model_path is not None:
+            self.model_bytes = os.path.getsize(model_path)
+            self._interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        else:
+            self.model_bytes = len(model_content)
+            self._interpreter = tf.lite.Interpreter(model_content=model_content, num_threads=num_threads)
+        self._input_index = self._interpreter.get_input_details()[0]['index']
+        self._output_index = self._interpreter.get_output_details()[0]['index']
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def predict(self, img_array, verbose=0):
+        img_array = np.ascontiguousarray(img_array, dtype=np.float32)
+        with self._lock:
+            # Only re-allocate when the batch size changes
+            if self._batch_size != len(img_array):
+                self._interpreter.resize_tensor_input(self._input_index, img_array.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = len(img_array)
+            self._interpreter.set_tensor(self._input_index, img_array)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output_index).copy()
+
+
+def latency_ms(predict, img_array, runs=20):
+    predict(img_array)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict(img_array)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'p50_ms': float(np.percentile(timings, 50)), 'p99_ms': float(np.percentile(timings, 99))}
+
+
+def evaluate_drift(float_model, quantized_model, images, threshold=0.5, batch_size=16):
+    """
+    Compare quantized against float32 probabilities on a held-out image set
+    """
+    float_probs = np.concatenate([float_model.predict(images[i:i + batch_size], verbose=0)[:, 0]
+                                  for i in range(0, len(images), batch_size)])
+    quant_probs = np.concatenate([quantized_model.predict(images[i:i + batch_size])[:, 0]
+                                  for i in range(0, len(images), batch_size)])
+    diff = np.abs(float_probs - quant_probs)
+    return {
+        'images': int(len(images)),
+        'max_abs_prob_diff': float(diff.max()),
+        'mean_abs_prob_diff': float(diff.mean()),
+        'decision_agreement': float(np.mean((float_probs > threshold) == (quant_probs > threshold)))
+    }
+
+
+def quantized_artifact_path(store_dir, model_name, mode):
+    return os.path.join(store_dir, f"{model_name}_{mode}.tflite")
+
+
+def save_quantized_model(model_content, store_dir, model_name, mode):
+    os.makedirs(store_dir, exist_ok=True)
+    path = quantized_artifact_path(store_dir, model_name, mode)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(model_content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=QUANTIZATION_MODES, default='dynamic')
+    parser.add_argument('--calibration-dir', help='representative X-rays for int8 calibration')
+    parser.add_argument('--eval-dir', required=True, help='held-out X-rays to measure drift on')
+    parser.add_argument('--limit', type=int, default=200, help='max images per directory')
+    args = parser.parse_args()
+
+    # The models must be loaded when the import returns
+    os.environ['BACKGROUND_LOADING'] = '0'
+    import app
+
+    calibration = None
+    if args.calibration_dir:
+        calibration = load_image_dir(args.calibration_dir, app.IMAGE_SIZE, args.limit)
+    held_out = load_image_dir(args.eval_dir, app.IMAGE_SIZE, args.limit)
+
+    report = {'mode': args.mode, 'rss_mb_float_models_loaded': current_rss_mb(), 'models': {}}
+    for model_name, float_model in (('TB_Model', app.tb_model), ('Pneumonia_Model', app.pneumonia_model)):
+        started = time.perf_counter()
+        content = convert_model(float_model, args.mode, calibration)
+        path = save_quantized_model(content, app.MODEL_STORE_DIR, model_name, args.mode)
+        quantized = TFLiteBinaryModel(content, model_name)
+
+        single = held_out[:1]
+        report['models'][model_name] = {
+            'artifact': path,
+            'convert_s': time.perf_counter() - started,
+            'float32_mb': float_model.count_params() * 4 / 1e6,
+            'quantized_mb': quantized.model_bytes / 1e6,
+            'drift': evaluate_drift(float_model, quantized, held_out),
+            'latency_float32': latency_ms(lambda x: float_model.predict(x, verbose=0), single),
+            'latency_quantized': latency_ms(quantized.predict, single)
+        }
+
+    report['rss_mb_after_quantized_loaded'] = current_rss_mb()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
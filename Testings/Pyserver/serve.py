@@ -0,0 +1,258 @@
+"""
+Pre-fork multi-process launcher for the prediction server.
+
+The master binds one listening socket and forks WORKERS processes that all
+accept on it, so requests are spread across processes instead of being
+serialized by one interpreter's GIL. Each worker runs its own threaded WSGI
+server with its own TF intra/inter-op thread pools.
+
+Model memory:
+  PRELOAD_APP=1  imports app.py (and loads the models) in the master before
+                 forking, so workers share the model pages copy-on-write. TF's
+                 runtime is not guaranteed to survive fork, so this is only honoured
+                 with QUANTIZED_MODE, with the .tflite artifacts already in the model
+                 store (no conversion in the master) and without CASCADE (its X-ray
+                 validation stage is a TF model). The master skips the warm-up so the
+                 TFLite interpreters have no thread pools yet; each worker warms up
+                 after the fork and reopens the prediction cache's SQLite file.
+  QUANTIZED_MODE TFLite memory-maps the .tflite files, so even without preloading
+                 every worker maps the same page-cache pages for the weights.
+
+Workers are recycled gracefully after MAX_REQUESTS requests (stop accepting,
+finish in-flight requests, exit; the master forks a replacement). Workers that
+fail (e.g. the models cannot be loaded) are replaced after an exponentially
+growing delay, and the master gives up after MAX_WORKER_FAILURES failures in a
+row. SIGTERM or SIGINT on the master drains and stops every worker.
+
+Usage: WORKERS=4 TF_INTRA_OP_THREADS=4 python serve.py
+"""
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 5000))
+WORKERS = int(os.environ.get('WORKERS', 2))
+PRELOAD_APP = os.environ.get('PRELOAD_APP', '0') == '1'
+QUANTIZED_MODE = os.environ.get('QUANTIZED_MODE', '')
+CASCADE = os.environ.get('CASCADE', '0') == '1'
+MODEL_STORE_DIR = os.environ.get('MODEL_STORE_DIR', 'model_store')
+MAX_REQUESTS = int(os.environ.get('MAX_REQUESTS', 0))  # 0 = never recycle
+GRACEFUL_TIMEOUT = float(os.environ.get('GRACEFUL_TIMEOUT', 30))
+MAX_WORKER_FAILURES = int(os.environ.get('MAX_WORKER_FAILURES', 10))
+MAX_RESPAWN_DELAY = float(os.environ.get('MAX_RESPAWN_DELAY', 60))
+
+# Split the cores between workers unless thread counts are given explicitly
+os.environ.setdefault('TF_INTRA_OP_THREADS', str(max(1, (os.cpu_count() or 1) // max(1, WORKERS))))
+os.environ.setdefault('TF_INTER_OP_THREADS', '1')
+
+workers = {}
+stopping = False
+stop_deadline = None
+
+
+def create_listener():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((HOST, PORT))
+    listener.listen(128)
+    listener.set_inheritable(True)
+    return listener
+
+
+class RequestCounter:
+    """
+    WSGI middleware that asks the worker to recycle itself after max_requests requests
+    """
+
+    def __init__(self, wsgi_app, max_requests, on_limit):
+        self.wsgi_app = wsgi_app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.count += 1
+            reached = self.max_requests and self.count == self.max_requests
+        if reached:
+            self.on_limit()
+        return self.wsgi_app(environ, start_response)
+
+
+def run_worker(listener):
+    from werkzeug.serving import make_server
+
+    import app as app_module
+
+    if PRELOAD_APP:
+        # Loaded by the master before the fork: nothing was warmed up and the SQLite
+        # connection belongs to the master
+        if app_module.prediction_cache is not None:
+            app_module.prediction_cache.reopen()
+        result, seconds = app_module.warm_up_models()
+        if result is None:
+            raise RuntimeError("Warm-up prediction failed")
+        print(f"🔥 Worker {os.getpid()} warmed up in {seconds:.2f}s", flush=True)
+
+    server = None
+
+    def shutdown():
+        # Stop accepting; serve_forever returns and server_close waits for in-flight requests
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    wsgi_app = app_module.app
+    if MAX_REQUESTS:
+        wsgi_app = RequestCounter(wsgi_app, MAX_REQUESTS, shutdown)
+
+    server = make_server(HOST, PORT, wsgi_app, threaded=True, fd=listener.fileno())
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    signal.signal(signal.SIGTERM, lambda *_: shutdown())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    print(f"👷 Worker {os.getpid()} serving (intra-op threads {os.environ['TF_INTRA_OP_THREADS']}, "
+          f"inter-op threads {os.environ['TF_INTER_OP_THREADS']})", flush=True)
+    server.serve_forever()
+    server.server_close()
+    print(f"👋 Worker {os.getpid()} exiting", flush=True)
+
+
+def spawn_worker(listener):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(listener)
+        except SystemExit as e:
+            # app.py exits when the models cannot be loaded; a worker never exits on purpose
+            print(f"❌ Worker {os.getpid()} exited during startup: {e.code}", flush=True)
+            code = e.code if isinstance(e.code, int) and e.code else 1
+        except BaseException as e:
+            print(f"❌ Worker {os.getpid()} crashed: {e!r}", flush=True)
+            code = 1
+        finally:
+            os._exit(code)
+    workers[pid] = time.time()
+    return pid
+
+
+def stop_workers(*_):
+    global stopping, stop_deadline
+    stopping = True
+    stop_deadline = time.time() + GRACEFUL_TIMEOUT
+    for pid in list(workers):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def preload_blocker():
+    """
+    Why the models cannot be loaded in the master before forking, or None if they can
+    """
+    if not QUANTIZED_MODE:
+        return "PRELOAD_APP needs QUANTIZED_MODE (TensorFlow is not fork-safe)"
+    if CASCADE:
+        return "PRELOAD_APP does not support CASCADE (its X-ray validation stage runs TensorFlow)"
+    missing = [name for name in ('TB_Model', 'Pneumonia_Model')
+               if not os.path.exists(os.path.join(MODEL_STORE_DIR, f"{name}_{QUANTIZED_MODE}.tflite"))]
+    if missing:
+        return f"PRELOAD_APP needs the {QUANTIZED_MODE} artifacts of {', '.join(missing)} in {MODEL_STORE_DIR} (converting runs TensorFlow)"
+    return None
+
+
+def main():
+    global stop_deadline, PRELOAD_APP
+    listener = create_listener()
+    print(f"🚀 Pre-fork server on {HOST}:{PORT} with {WORKERS} workers (master {os.getpid()})", flush=True)
+
+    blocker = preload_blocker() if PRELOAD_APP else None
+    if blocker:
+        print(f"⚠️ {blocker}; loading models in each worker", flush=True)
+        PRELOAD_APP = False
+
+    if PRELOAD_APP:
+        print("📦 Preloading app and models in the master before forking...", flush=True)
+        # The loader thread would not survive fork, so the master loads synchronously,
+        # and warm-up runs in each worker so no thread pools exist before the fork
+        os.environ['BACKGROUND_LOADING'] = '0'
+        os.environ['WARM_UP_MODELS'] = '0'
+        import app  # noqa: F401
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+
+    for _ in range(WORKERS):
+        spawn_worker(listener)
+
+    # Replacements for failed workers wait respawn_delay, doubling with every failure in a row
+    respawns = []
+    failures = 0
+    exit_code = 0
+
+    while workers or (respawns and not stopping):
+        if respawns and not stopping and time.time() >= respawns[0]:
+            respawns.pop(0)
+            spawn_worker(listener)
+            continue
+        if not workers:
+            time.sleep(0.1)
+            continue
+
+        if stopping and time.time() > stop_deadline:
+            # Workers that have not drained in time are killed
+            for pid in list(workers):
+                print(f"⚠️ Worker {pid} did not stop within {GRACEFUL_TIMEOUT}s, killing", flush=True)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            stop_deadline = float('inf')
+
+        # Never block: a SIGTERM arriving mid-wait would not wake a blocking waitpid, and
+        # workers that hang while draining must still be killed at stop_deadline
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+
+        code = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status
+        if code == 0:
+            failures = 0
+            print(f"♻️ Worker {pid} exited after {time.time() - started:.0f}s, starting replacement", flush=True)
+            spawn_worker(listener)
+            continue
+
+        failures += 1
+        if failures >= MAX_WORKER_FAILURES:
+            print(f"❌ Worker {pid} failed (code {code}); {failures} failures in a row, giving up", flush=True)
+            exit_code = 1
+            stop_workers()
+            continue
+
+        delay = min(MAX_RESPAWN_DELAY, 2 ** (failures - 1))
+        print(f"⚠️ Worker {pid} failed (code {code}) after {time.time() - started:.0f}s, "
+              f"replacing it in {delay:.0f}s ({failures} failures in a row)", flush=True)
+        respawns.append(time.time() + delay)
+
+    listener.close()
+    print("✅ All workers stopped", flush=True)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
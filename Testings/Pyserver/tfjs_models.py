@@ -0,0 +1,110 @@
+"""
+Load TensorFlow.js layers-models (model.json + binary weight shards), as exported for
+the Node backend under Backend/src/trained_model, straight into Keras, without the
+tensorflowjs package.
+"""
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+DTYPES = {'float32': np.float32, 'int32': np.int32, 'bool': np.bool_}
+QUANTIZED_DTYPES = {'uint8': np.uint8, 'uint16': np.uint16, 'float16': np.float16}
+
+
+def read_model_json(model_dir):
+    with open(os.path.join(model_dir, 'model.json')) as f:
+        return json.load(f)
+
+
+def read_metadata(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def missing_shards(model_dir):
+    """
+    Weight shard files listed in model.json that are not on disk
+    """
+    manifest = read_model_json(model_dir)['weightsManifest']
+    return [p for group in manifest for p in group['paths'] if not os.path.exists(os.path.join(model_dir, p))]
+
+
+def read_shard(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def decode_weights(model_dir, weights_manifest):
+    """
+    Read every weight group's shards and slice them into {name: array}
+    """
+    weights = {}
+    for group in weights_manifest:
+        buffer = b''.join(read_shard(os.path.join(model_dir, p)) for p in group['paths'])
+        offset = 0
+        for spec in group['weights']:
+            shape = spec['shape']
+            count = int(np.prod(shape)) if shape else 1
+            quantization = spec.get('quantization')
+
+            if quantization:
+                dtype = QUANTIZED_DTYPES[quantization['dtype']]
+                size = count * np.dtype(dtype).itemsize
+                values = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+                if quantization['dtype'] == 'float16':
+                    values = values.astype(np.float32)
+                else:
+                    values = values.astype(np.float32) * quantization['scale'] + quantization['min']
+            else:
+                dtype = DTYPES[spec['dtype']]
+                size = count * np.dtype(dtype).itemsize
+                values = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+
+            weights[spec['name']] = values.reshape(shape)
+            offset += size
+    return weights
+
+
+def flatten_layers(model):
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.Model):
+            yield from flatten_layers(layer)
+        else:
+            yield layer
+
+
+def load_layers_model(model_dir):
+    """
+    Build the Keras model described by model_dir/model.json and load its weights by
+    "<layer>/<weight>" name. Raises FileNotFoundError when weight shards are missing
+    and ValueError when the weights do not match the topology.
+    """
+    missing = missing_shards(model_dir)
+    if missing:
+        raise FileNotFoundError(f"{model_dir} is missing {len(missing)} weight shard(s), e.g. {missing[0]}")
+
+    content = read_model_json(model_dir)
+    topology = content['modelTopology']
+    model = tf.keras.models.model_from_json(json.dumps(topology.get('model_config', topology)))
+    weights = decode_weights(model_dir, content['weightsManifest'])
+
+    assigned = set()
+    for layer in flatten_layers(model):
+        values = []
+        for variable in layer.weights:
+            name = f"{layer.name}/{variable.name.split('/')[-1].split(':')[0]}"
+            if name not in weights:
+                raise ValueError(f"{model_dir}: no weights for {name}")
+            if tuple(weights[name].shape) != tuple(variable.shape):
+                raise ValueError(f"{model_dir}: {name} has shape {weights[name].shape}, expected {variable.shape}")
+            values.append(weights[name])
+            assigned.add(name)
+        if values:
+            layer.set_weights(values)
+
+    unused = set(weights) - assigned
+    if unused:
+        raise ValueError(f"{model_dir}: {len(unused)} weights do not match any layer, e.g. {sorted(unused)[0]}")
+    return model
@@ -0,0 +1,71 @@
+import numpy as np
+import tensorflow as tf
+
+
+def view_parameters(k, max_shift=0.05, scale_range=0.1, contrast_range=0.1, seed=0):
+    """
+    Deterministic (scale, shift_x, shift_y, contrast) for k views. View 0 is always the
+    unaugmented image, so k=1 is the plain prediction. Shifts are fractions of the image size.
+    """
+    rng = np.random.default_rng(seed)
+    params = np.empty((k, 4), dtype=np.float32)
+    params[0] = (1.0, 0.0, 0.0, 1.0)
+    if k > 1:
+        params[1:, 0] = 1.0 + rng.uniform(-scale_range, scale_range, k - 1)
+        params[1:, 1:3] = rng.uniform(-max_shift, max_shift, (k - 1, 2))
+        params[1:, 3] = 1.0 + rng.uniform(-contrast_range, contrast_range, k - 1)
+    return params
+
+
+def affine_transforms(params, size):
+    """
+    Projective transform rows (output pixel -> input pixel) for a scale about the
+    image centre followed by a shift, as ImageProjectiveTransformV3 expects
+    """
+    center = (size - 1) / 2.0
+    inverse_scale = 1.0 / params[:, 0]
+    shift_x = params[:, 1] * size
+    shift_y = params[:, 2] * size
+    zeros = np.zeros_like(inverse_scale)
+    return np.stack([
+        inverse_scale, zeros, center - center * inverse_scale - shift_x,
+        zeros, inverse_scale, center - center * inverse_scale - shift_y,
+        zeros, zeros
+    ], axis=1).astype(np.float32)
+
+
+def augment_views(img_array, params):
+    """
+    Build len(params) augmented views of every image of a (N, H, W, 3) float32 [0, 1] batch.
+    Returns (N * k, H, W, 3), views of image i at rows i*k .. i*k + k - 1.
+    Shift and scale run as one batched bilinear warp (edges replicated), then contrast is
+    scaled around each view's mean.
+    """
+    n, height, width, _ = img_array.shape
+    k = len(params)
+
+    images = np.repeat(img_array, k, axis=0)
+    transforms = np.tile(affine_transforms(params, width), (n, 1))
+    warped = tf.raw_ops.ImageProjectiveTransformV3(
+        images=tf.convert_to_tensor(images, dtype=tf.float32),
+        transforms=tf.convert_to_tensor(transforms),
+        output_shape=tf.constant([height, width], dtype=tf.int32),
+        fill_value=tf.constant(0.0, dtype=tf.float32),
+        interpolation='BILINEAR',
+        fill_mode='NEAREST'
+    ).numpy()
+
+    contrast = np.tile(params[:, 3], n).reshape(-1, 1, 1, 1)
+    mean = warped.mean(axis=(1, 2, 3), keepdims=True)
+    np.subtract(warped, mean, out=warped)
+    np.multiply(warped, contrast, out=warped)
+    np.add(warped, mean, out=warped)
+    return np.clip(warped, 0.0, 1.0, out=warped)
+
+
+def summarize_views(probs, k):
+    """
+    Mean and variance over the k views of each image: (N * k,) -> ((N,), (N,))
+    """
+    per_image = np.asarray(probs, dtype=np.float64).reshape(-1, k)
+    return per_image.mean(axis=1), per_image.var(axis=1)
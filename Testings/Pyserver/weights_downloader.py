@@ -0,0 +1,224 @@
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from html import unescape
+from urllib.parse import urlencode, urljoin
+
+import requests
+
+# Drive's "can't scan this file for viruses" page: a form whose hidden inputs carry the confirm token
+FORM_ACTION_RE = re.compile(r'<form[^>]*action="([^"]+)"', re.IGNORECASE)
+HIDDEN_INPUT_RE = re.compile(r'<input[^>]*type="hidden"[^>]*name="([^"]+)"[^>]*value="([^"]*)"', re.IGNORECASE)
+CONFIRM_TOKEN_RE = re.compile(r'confirm=([0-9A-Za-z_\-]+)')
+MAX_INTERSTITIAL_BYTES = 1024 * 1024
+
+
+class WeightsDownloadError(Exception):
+    pass
+
+
+def sha256_of_file(path, chunk_size=4 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest
+
+
+def checksum_path(path):
+    return path + '.sha256'
+
+
+def partial_path(path):
+    return path + '.part'
+
+
+def read_recorded_checksum(path):
+    try:
+        with open(checksum_path(path)) as f:
+            return f.read().split()[0]
+    except (OSError, IndexError):
+        return None
+
+
+def write_recorded_checksum(path, digest):
+    tmp_path = checksum_path(path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(f"{digest}  {os.path.basename(path)}\n")
+    os.replace(tmp_path, checksum_path(path))
+
+
+class WeightsDownloader:
+    """
+    Streaming, resumable, checksum-verified downloader for model weight files.
+
+    Data is streamed in large chunks into "<path>.part" and only renamed to path
+    once complete and verified, with the SHA-256 recorded in "<path>.sha256". A
+    cached file counts as valid only when it matches that record (and the expected
+    checksum, when one is given); anything else is re-downloaded. An interrupted
+    download resumes from the end of "<path>.part" with an HTTP Range request.
+    Google Drive's virus-scan interstitial is detected from the Content-Type and
+    followed without reading the file body into memory.
+    """
+
+    def __init__(self, timeout=60, chunk_size=1024 * 1024, write_buffer=8 * 1024 * 1024,
+                 max_retries=3, progress_interval=5.0, session=None):
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.write_buffer = write_buffer
+        self.max_retries = max(1, int(max_retries))
+        self.progress_interval = progress_interval
+        self.session = session or requests.Session()
+
+    def is_cached(self, path, sha256=None):
+        """
+        True when path exists and matches its recorded (and the expected) checksum
+        """
+        recorded = read_recorded_checksum(path)
+        if not os.path.exists(path) or recorded is None:
+            return False
+        if sha256 and recorded != sha256.lower():
+            return False
+        return sha256_of_file(path).hexdigest() == recorded
+
+    def download(self, url, path, sha256=None):
+        """
+        Download url to path unless a verified copy is already there. Returns path.
+        Raises WeightsDownloadError when every attempt fails or the checksum does not match.
+        """
+        if self.is_cached(path, sha256):
+            print(f"✓ {path} already downloaded and verified, skipping download")
+            return path
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        part = partial_path(path)
+        if os.path.exists(path):
+            if read_recorded_checksum(path) is not None or os.path.exists(part):
+                # Complete once but no longer matching its checksum: start over
+                os.remove(path)
+            else:
+                # Unverified file from an older download: treat it as a partial one
+                os.replace(path, part)
+
+        last_error = None
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                digest = self._download_to_part(url, part)
+                break
+            except (requests.RequestException, OSError, WeightsDownloadError) as e:
+                last_error = e
+                print(f"⚠️ Download attempt {attempt}/{self.max_retries} for {path} failed: {e}")
+                if attempt < self.max_retries:
+                    time.sleep(min(2 ** attempt, 10))
+        else:
+            raise WeightsDownloadError(f"Failed to download {url}: {last_error}")
+
+        actual = digest.hexdigest()
+        if sha256 and actual != sha256.lower():
+            os.remove(part)
+            raise WeightsDownloadError(f"Checksum mismatch for {path}: expected {sha256}, got {actual}")
+
+        os.replace(part, path)
+        write_recorded_checksum(path, actual)
+        print(f"✓ Download completed: {path} ({os.path.getsize(path)} bytes, sha256 {actual[:12]})")
+        return path
+
+    def download_many(self, jobs, max_workers=None):
+        """
+        Download several (url, path, sha256) jobs concurrently. Returns one path or
+        exception per job, in order.
+        """
+        def run(job):
+            try:
+                return self.download(*job)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(jobs) or 1, thread_name_prefix='weights') as executor:
+            return list(executor.map(run, jobs))
+
+    def _open(self, url, offset):
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+
+        if 'text/html' in response.headers.get('Content-Type', ''):
+            next_url = self._follow_interstitial(url, response)
+            response.close()
+            response = self.session.get(next_url, headers=headers, stream=True, timeout=self.timeout)
+            if 'text/html' in response.headers.get('Content-Type', ''):
+                response.close()
+                raise WeightsDownloadError(f"Got an HTML page instead of the file from {url}")
+        return response
+
+    def _follow_interstitial(self, url, response):
+        # The warning page is small; read at most MAX_INTERSTITIAL_BYTES of it
+        body = b''
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            body += chunk
+            if len(body) >= MAX_INTERSTITIAL_BYTES:
+                break
+        html = body.decode('utf-8', errors='replace')
+
+        form = FORM_ACTION_RE.search(html)
+        inputs = HIDDEN_INPUT_RE.findall(html)
+        if form and inputs:
+            print("Detected Google Drive virus scan warning, following the download form...")
+            query = urlencode([(name, unescape(value)) for name, value in inputs])
+            return f"{urljoin(response.url, unescape(form.group(1)))}?{query}"
+
+        token = CONFIRM_TOKEN_RE.search(html)
+        if token and 'id=' in url:
+            print(f"Detected Google Drive virus scan warning, confirm token: {token.group(1)}")
+            return f"https://drive.google.com/uc?export=download&confirm={token.group(1)}&id={url.split('id=')[1]}"
+
+        raise WeightsDownloadError(f"Got an HTML page instead of the file from {url}")
+
+    def _download_to_part(self, url, part):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        response = self._open(url, offset)
+
+        if response.status_code == 416 and offset:
+            # Nothing left to fetch if the partial file already has the full length
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            response.close()
+            if total.isdigit() and int(total) == offset:
+                return sha256_of_file(part)
+            offset = 0
+            response = self._open(url, 0)
+
+        with response:
+            response.raise_for_status()
+
+            if offset and response.status_code == 206:
+                start = response.headers.get('Content-Range', '').split(' ')[-1].split('-')[0]
+                if start != str(offset):
+                    raise WeightsDownloadError(f"Server resumed at byte {start}, expected {offset}")
+                print(f"Resuming {os.path.basename(part)} from byte {offset}")
+                digest = sha256_of_file(part)
+                mode = 'ab'
+            else:
+                # Server ignored the Range header (or nothing to resume): start over
+                offset = 0
+                digest = hashlib.sha256()
+                mode = 'wb'
+
+            remaining = response.headers.get('Content-Length')
+            total = offset + int(remaining) if remaining and remaining.isdigit() else None
+            downloaded = offset
+            last_report = time.perf_counter()
+
+            with open(part, mode, buffering=self.write_buffer) as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    downloaded += len(chunk)
+                    if time.perf_counter() - last_report >= self.progress_interval:
+                        last_report = time.perf_counter()
+                        progress = f" ({downloaded / total * 100:.0f}%)" if total else ''
+                        print(f"  {os.path.basename(part)}: {downloaded / 1e6:.1f} MB{progress}", flush=True)
+
+        if total is not None and downloaded != total:
+            raise WeightsDownloadError(f"Incomplete download: got {downloaded} of {total} bytes")
+        return digest